@@ -0,0 +1,474 @@
+'''
+Vectorized version of the Tunk simulation in Tunk_Simulator.py
+
+Instead of playing one game at a time with Card objects, BatchGame keeps N games
+as numpy arrays and advances every active game by one turn per step:
+  - decks are (N, 54) int8 permutations of the card ids, drawn from the front and only
+    shuffled as far as they are drawn (the deal at the start of a round, then one
+    Fisher-Yates swap per card drawn)
+  - hands are (N, 4, 5) int8 card ids, -1 marks an empty slot
+  - the discard pile is only ever read from the top, so it is kept as an (N,) vector,
+    the rest of it is every card in neither a hand nor the deck
+The sizes are those of the standard rules, games played with other rules (see Tunk_Rules)
+have one row per seat and one slot per card of their hand size, and their card ids and
+lookup tables come from the rules.
+Every game has a 64 bit seed and the deck of each round is a fixed function of the
+game's seed and the round number (see Tunk_Seeding), so the same seeds deal the same
+cards no matter which strategies or parameters are played (common random numbers),
+and Tunk_Simulator plays a game with the same seed exactly the same way.
+The strategies' decisions come from the batch forms of Tunk_Strategies, called once per
+step for every strategy in play, and the call_tunk/end_round scoring is applied to all
+games at once with masks.
+'''
+
+import numpy
+
+import Tunk_Rules
+import Tunk_Simulator
+import Tunk_Strategies
+import Tunk_Trajectories
+from Tunk_Seeding import deck_keys, shuffled_decks, swap_targets
+
+
+STANDARD_RULES = Tunk_Rules.STANDARD_RULES
+NUM_PLAYERS = STANDARD_RULES.num_players
+HAND_SIZE = STANDARD_RULES.hand_size
+TUNK_CALL_VALUE = Tunk_Simulator.TUNK_CALL_VALUE   # A player calls tunk when their hand is worth this much or less
+MAX_GO_AROUNDS = Tunk_Simulator.MAX_GO_AROUNDS   # Rounds still going after this many go arounds are ended like an empty deck
+
+# Card ids are the same as in Tunk_Simulator
+CARD_VALUES = numpy.array(Tunk_Simulator.CARD_VALUES, dtype=numpy.int16)
+CARD_RANKS = numpy.array(Tunk_Simulator.CARD_RANKS, dtype=numpy.int16)
+DECK_SIZE = STANDARD_RULES.deck_size
+
+# Same tables with one extra entry so that indexing with -1 (an empty hand slot) gives value 0 / rank -1
+VALUE_LOOKUP = STANDARD_RULES.value_lookup
+RANK_LOOKUP = STANDARD_RULES.rank_lookup
+
+
+class Turn:
+  '''
+  The hands of the players taking a normal turn, one row per game, as the batch forms
+  of the strategies see them. players is the seat of each row.
+  discard is the default discard (every card of the most common rank if it has multiples
+  worth more than 5, otherwise the highest card), multiples is True where that discard is
+  multiples and discard_value is the value of the card(s) in it.
+  games and players are the game and seat of each row.
+  Cards are looked up in the tables of rules, the standard rules by default.
+  '''
+  def __init__(self, players, hands, top, rules=STANDARD_RULES, games=None):
+    rows = numpy.arange(len(hands))
+    value_lookup = rules.value_lookup
+    rank_lookup = rules.rank_lookup
+    self.games = games
+    self.players = players
+    self.hands = hands
+    self.valid = valid = hands >= 0
+    self.values = values = value_lookup[hands]
+    self.ranks = ranks = rank_lookup[hands]
+    self.top = top
+    self.top_value = value_lookup[top]
+    self.top_rank = rank_lookup[top]
+
+    # Number of cards in the hand with the same rank as each card
+    counts = ((ranks[:, :, None] == ranks[:, None, :]) & valid[:, None, :]).sum(2)*valid
+    max_count = counts.max(1)
+    # Among the most common ranks take the highest value, ties go to the rank seen first in the hand
+    common_slot = self.highest_slots(values, valid & (counts == max_count[:, None]))
+    self.max_count = max_count
+    self.common_value = values[rows, common_slot]
+    self.common = valid & (ranks == ranks[rows, common_slot][:, None])
+    highest_slot = self.highest_slots(values, valid)
+    self.highest = numpy.arange(hands.shape[1])[None, :] == highest_slot[:, None]
+    self.highest_value = values[rows, highest_slot]
+    (self.discard, self.multiples, self.discard_value) = self.pair_discard(slice(None), Tunk_Strategies.PAIR_VALUE)
+
+  def pair_discard(self, rows, pair_value):
+    '''
+    (discard masks, True where they are multiples, value of the discarded cards) of the
+    given rows when multiples worth at least pair_value (a number or one per row) are discarded.
+    '''
+    multiples = (self.max_count[rows] > 1) & (self.common_value[rows] >= pair_value)  # If the hand has multiples, discard all of them
+    discard = numpy.where(multiples[:, None], self.common[rows], self.highest[rows])
+    return (discard, multiples, numpy.where(multiples, self.common_value[rows], self.highest_value[rows]))
+
+  @staticmethod
+  def highest_slots(values, mask):
+    '''
+    Slot of the highest value among the masked slots of each row, ties go to the earlier slot.
+    '''
+    hand_size = values.shape[1]
+    slot_order = hand_size - numpy.arange(hand_size)  # Earlier slots win ties, like the first match in a list
+    return numpy.where(mask, values*(hand_size+1) + slot_order, -1).argmax(1)
+
+
+class BatchResult:
+  '''
+  Results of a batch of games.
+  wins/losses are per seat counts like WINS/LOSSES in Tunk_Simulator.
+  score_counts is the sum over all games of each games average hand value per
+    go around (CALLING_ARRAY.sum(0) in Tunk_Simulator).
+  go_arounds is an optional (game, round, go_around, average hand value) record of every go around.
+  trajectories is a Tunk_Trajectories.TrajectoryStats of the hand values at the end of every go around.
+  '''
+  def __init__(self, scores, losers, rounds, score_counts, go_arounds=None, trajectories=None):
+    self.scores = scores
+    self.losers = losers
+    self.rounds = rounds
+    self.score_counts = score_counts
+    self.go_arounds = go_arounds
+    self.trajectories = trajectories
+
+  @property
+  def num_games(self):
+    return len(self.rounds)
+
+  @property
+  def wins(self):
+    return (~self.losers).sum(0)
+
+  @property
+  def losses(self):
+    return self.losers.sum(0)
+
+  @staticmethod
+  def merge(results):
+    '''
+    Concatenates the results of several batches into one result.
+    '''
+    results = list(results)
+    go_arounds = None
+    if all(result.go_arounds is not None for result in results):
+      offset = 0
+      parts = []
+      for result in results:
+        games, rounds, go_around, average = result.go_arounds
+        parts.append((games + offset, rounds, go_around, average))
+        offset += result.num_games
+      go_arounds = tuple(numpy.concatenate(column) for column in zip(*parts))
+    trajectories = None
+    if all(result.trajectories is not None for result in results):
+      trajectories = results[0].trajectories
+      for result in results[1:]:
+        trajectories.merge(result.trajectories)
+    return BatchResult(numpy.concatenate([result.scores for result in results]),
+                       numpy.concatenate([result.losers for result in results]),
+                       numpy.concatenate([result.rounds for result in results]),
+                       sum(result.score_counts for result in results),
+                       go_arounds, trajectories)
+
+
+class BatchGame:
+
+  def __init__(self, strategies, num_games, rng=None, beta=None, player_1_beta=None, tunk_call_value=None, threshhold=None,
+               seeds=None, keep_go_arounds=False, oracle=None, rules=None):
+    '''
+    Sets up num_games games between the given strategies, names registered in
+    Tunk_Strategies or Strategy objects with batch forms.
+    beta, player_1_beta, tunk_call_value and oracle are used to make the named strategies
+    (see Tunk_Strategies.seat_strategies).
+    rules is a Tunk_Rules.Rules, the standard rules with one seat per strategy by default,
+    threshhold overrides the threshhold of the rules.
+    seeds gives the seed of every game, they are drawn from rng if not given.
+    '''
+    rules = Tunk_Rules.rules_for(strategies, rules)
+    seats = Tunk_Strategies.seat_strategies(strategies, beta, player_1_beta, tunk_call_value, oracle)
+    for strategy in seats:
+      if not strategy.has_batch_form():
+        raise ValueError('Strategy ' + str(strategy.name) + ' has no batch form')
+    if seeds is None:
+      rng = rng if rng is not None else numpy.random.default_rng()
+      seeds = rng.integers(0, 2**64, num_games, dtype=numpy.uint64, endpoint=False)
+    if len(seeds) != num_games:
+      raise ValueError('Expected one seed per game')
+    self.seeds = numpy.asarray(seeds, dtype=numpy.uint64)
+    self.num_games = num_games
+    # Seats whose strategies are in the same batch group make their decisions together
+    self.seat_strategies = seats
+    self.group_strategies = []
+    keys = []
+    for strategy in seats:
+      if strategy.batch_group() not in keys:
+        keys.append(strategy.batch_group())
+        self.group_strategies.append(strategy)
+    self.seat_groups = numpy.array([keys.index(strategy.batch_group()) for strategy in seats])
+    self.seat_arrays = {}
+    self.rules = rules
+    self.num_players = rules.num_players
+    self.hand_size = rules.hand_size
+    self.deck_size = rules.deck_size
+    self.value_lookup = rules.value_lookup
+    self.threshhold = threshhold if threshhold is not None else rules.threshhold
+    self.keep_go_arounds = keep_go_arounds
+    self.single_round = False   # Stop each game at the end of its current round instead of dealing the next one
+
+    self.deck = numpy.empty((num_games, self.deck_size), dtype=rules.card_dtype)
+    self.deck_pos = numpy.zeros(num_games, dtype=numpy.int64)    # Index of the next card to draw in each deck
+    self.deck_keys = numpy.zeros(num_games, dtype=numpy.uint64)  # Key of the shuffle of each deck (Tunk_Seeding.swap_targets)
+    self.reshuffles = numpy.zeros(num_games, dtype=numpy.int64)  # Discard piles shuffled back into the deck this round
+    self.hands = numpy.full((num_games, self.num_players, self.hand_size), -1, dtype=rules.card_dtype)
+    self.top = numpy.zeros(num_games, dtype=rules.card_dtype)   # Top card of each discard pile
+    self.low_discarded = numpy.zeros(num_games, dtype=numpy.int16) # Number of low cards discarded this round
+    # Cards turned face up this round and not shuffled back into the deck, only kept for strategies that count cards
+    # (see Tunk_Counting), with an extra column that stays False for empty hand slots
+    self.counting = any(strategy.counts_cards for strategy in seats)
+    self.shown = numpy.zeros((num_games, self.deck_size + 1), dtype=bool) if self.counting else None
+    self.scores = numpy.zeros((num_games, self.num_players), dtype=numpy.int64)
+    self.whose_turn = numpy.zeros(num_games, dtype=numpy.int64)
+    self.spot_on_table = numpy.ones(num_games, dtype=numpy.int64)
+    self.go_around = numpy.zeros(num_games, dtype=numpy.int64)
+    self.round_count = numpy.zeros(num_games, dtype=numpy.int64)
+    self.active = numpy.ones(num_games, dtype=bool)
+    self.turn_count = 0   # Turns played across all games, tunk calls and empty decks included
+    self.records = []
+    self.trajectories = Tunk_Trajectories.TrajectoryStats(self.seat_names(), rules)
+
+  def new_round(self, games):
+    '''
+    Shuffles a new deck for each of the given games, deals a hand to each player
+    and turns the next card over to start the discard pile.
+    '''
+    self.round_count[games] += 1
+    self.go_around[games] = 0
+    dealt = self.num_players*self.hand_size
+    keys = deck_keys(self.seeds[games], self.round_count[games])
+    decks = shuffled_decks(keys, self.deck_size, dealt + 1)
+    self.deck[games] = decks
+    self.deck_keys[games] = keys
+    self.reshuffles[games] = 0
+    self.hands[games] = decks[:, :dealt].reshape(len(games), self.hand_size, self.num_players).transpose(0, 2, 1)  # Dealt one card at a time around the table
+    self.top[games] = decks[:, dealt]
+    self.deck_pos[games] = dealt + 1
+    self.low_discarded[games] = 0
+    if self.counting:
+      self.shown[games] = False
+      self.shown[games, self.top[games]] = True
+
+  def reshuffle_discards(self, games):
+    '''
+    Shuffles the discard pile, all but the top card, back into the empty deck of each of the
+    given games that has cards in it (rules.reshuffles), in card id order like Tunk_Simulator.
+    '''
+    rows = numpy.arange(len(games))
+    out = numpy.zeros((len(games), self.deck_size + 1), dtype=bool)   # Last column for empty hand slots
+    out[rows[:, None], self.hands[games].reshape(len(games), self.num_players*self.hand_size)] = True
+    out[rows, self.top[games]] = True
+    pile = ~out[:, :self.deck_size]
+    count = pile.sum(1)
+    games = games[count > 0]
+    # The pile's cards in id order at the end of the deck, after the cards in play
+    self.deck[games] = numpy.argsort(pile[count > 0], axis=1, kind='stable')
+    self.deck_pos[games] = self.deck_size - count[count > 0]
+    self.reshuffles[games] += 1
+    self.deck_keys[games] = deck_keys(self.seeds[games], self.round_count[games], self.reshuffles[games])
+    self.low_discarded[games] = self.rules.low_lookup[self.top[games]]   # The cards back in the deck are no longer out of play
+    if self.counting:
+      self.shown[games, :self.deck_size] &= ~pile[count > 0]
+
+  def score_round(self, games, players, deck_empty):
+    '''
+    Ends the round for the given games, either because the deck ran out (end_round)
+    or because the current player called tunk (call_tunk).
+    '''
+    hand_values = self.value_lookup[self.hands[games]].sum(2)
+    scores = self.scores[games]
+
+    # Deck is empty: everyone adds their hand value, the lowest hand adds another 15 points
+    empty = numpy.flatnonzero(deck_empty)
+    scores[empty] += hand_values[empty]
+    scores[empty, hand_values[empty].argmin(1)] += self.rules.lowest_hand_penalty
+
+    # Tunk: if the caller has the lowest hand everyone else adds their hand value, otherwise the caller adds 30
+    tunk = numpy.flatnonzero(~deck_empty)
+    callers = players[tunk]
+    caller_values = hand_values[tunk, callers]
+    other_values = hand_values[tunk].copy()
+    other_values[numpy.arange(len(tunk)), callers] = numpy.iinfo(other_values.dtype).max
+    lowest = caller_values <= other_values.min(1)
+    won = tunk[lowest]
+    not_caller = numpy.arange(self.num_players)[None, :] != callers[lowest][:, None]
+    scores[won] += hand_values[won]*not_caller
+    lost = tunk[~lowest]
+    scores[lost, callers[~lowest]] += self.rules.wrong_tunk_penalty
+    self.scores[games] = scores
+
+    # The winner of a tunk call (or the lowest other hand if the call was wrong) finishes the turn
+    whose_turn = players.copy()
+    whose_turn[lost] = other_values[~lowest].argmin(1)
+    return whose_turn
+
+  def strategy_groups(self, players):
+    '''
+    (strategy, rows) for every strategy with a player in players, rows index into players.
+    '''
+    if len(self.group_strategies) == 1:
+      return [(self.group_strategies[0], slice(None))]
+    groups = self.seat_groups[players]
+    found = []
+    for index, strategy in enumerate(self.group_strategies):
+      rows = numpy.flatnonzero(groups == index)
+      if len(rows):
+        found.append((strategy, rows))
+    return found
+
+  def seat_values(self, name):
+    '''
+    Array of the given attribute of each seat's strategy, e.g. seat_values('beta').
+    Seats where it is set per game (see Tunk_Strategies.TunedStrategy) get nan.
+    '''
+    if name not in self.seat_arrays:
+      values = [getattr(strategy, name) for strategy in self.seat_strategies]
+      self.seat_arrays[name] = numpy.array([value if numpy.ndim(value) == 0 else numpy.nan for value in values])
+    return self.seat_arrays[name]
+
+  def seat_names(self):
+    return [strategy.name or type(strategy).__name__ for strategy in self.seat_strategies]
+
+  def deck_left(self, games):
+    return self.deck_size - self.deck_pos[games]
+
+  def low_discards(self, games):
+    '''
+    Number of low cards (see Tunk_Simulator.LOW_CARD_MASK) discarded this round in each game.
+    '''
+    return self.low_discarded[games]
+
+  def take_turns(self, games, players):
+    '''
+    Takes a normal turn (discard then draw) for the given player in each of the given games.
+    '''
+    rows = numpy.arange(len(games))
+    hands = self.hands[games, players]
+    top = self.top[games]
+    turn = Turn(players, hands, top, self.rules, games)
+    discard = numpy.zeros(hands.shape, dtype=bool)
+    take = numpy.zeros(len(games), dtype=bool)
+    for (strategy, group) in self.strategy_groups(players):
+      discard[group] = strategy.discard_batch(self, turn, group)
+      take[group] = strategy.draw_batch(self, turn, group, discard[group])
+
+    remaining = turn.valid & ~discard
+    hand_size = remaining.sum(1)
+    # Player has discarded their last card, take the top discard if it is lower
+    last_card = numpy.flatnonzero(hand_size == 0)
+    take[last_card] = turn.top_value[last_card] < turn.values[last_card, discard[last_card].argmax(1)]
+
+    # The cards kept stay in order, the drawn card goes at the end and the last card discarded ends up on top
+    new_hands = numpy.take_along_axis(hands, numpy.argsort(~remaining, axis=1, kind='stable'), axis=1)
+    new_hands[numpy.arange(self.hand_size)[None, :] >= hand_size[:, None]] = -1
+    from_deck = numpy.flatnonzero(~take)
+    drawn = top.copy()
+    drawing = games[from_deck]
+    position = self.deck_pos[drawing]
+    # Fisher-Yates: swap the drawn card into place, in the flat decks
+    start = drawing*self.deck_size
+    target = start + swap_targets(self.deck_keys[drawing], position, self.deck_size)
+    position += start
+    decks = self.deck.reshape(-1)
+    drawn[from_deck] = decks[target]
+    decks[target] = decks[position]
+    decks[position] = drawn[from_deck]
+    self.deck_pos[drawing] += 1
+    new_hands[rows, hand_size] = drawn
+    self.hands[games, players] = new_hands
+    self.top[games] = hands[rows, self.hand_size - 1 - discard[:, ::-1].argmax(1)]
+    self.low_discarded[games] += (discard & self.rules.low_lookup[hands]).sum(1)
+    if self.counting:
+      (discarding, slots) = numpy.nonzero(discard)
+      self.shown[games[discarding], hands[discarding, slots]] = True
+
+  def step(self):
+    '''
+    Plays one turn in every game that is not over.
+    '''
+    games = numpy.flatnonzero(self.active)
+    self.turn_count += len(games)
+    players = self.whose_turn[games]
+    hand_values = self.value_lookup[self.hands[games, players]].sum(1)
+    stuck = self.go_around[games] >= MAX_GO_AROUNDS - 1
+    if self.rules.reshuffles:
+      reshuffle = (self.deck_pos[games] >= self.deck_size) & ~stuck & (self.reshuffles[games] < self.rules.reshuffles)
+      self.reshuffle_discards(games[reshuffle])
+    deck_empty = (self.deck_pos[games] >= self.deck_size) | stuck
+    call = numpy.zeros(len(games), dtype=bool)
+    for (strategy, group) in self.strategy_groups(players):
+      call[group] = strategy.call_tunk_batch(self, games[group], players[group], hand_values[group])
+    round_over = deck_empty | call
+
+    turn = ~round_over
+    self.take_turns(games[turn], players[turn])
+    players[round_over] = self.score_round(games[round_over], players[round_over], deck_empty[round_over])
+
+    # Record the average hand value after every player has had a turn
+    full = self.spot_on_table[games] == self.num_players
+    self.spot_on_table[games] += 1
+    go_around_games = games[full]
+    self.spot_on_table[go_around_games] = 1
+    hand_values = self.value_lookup[self.hands[go_around_games]].sum(2)
+    rounds = self.round_count[go_around_games]
+    self.trajectories.add(hand_values, rounds, self.go_around[go_around_games])
+    averages = hand_values.sum(1)*1./self.num_players
+    self.records.append((go_around_games, rounds, self.go_around[go_around_games], averages))
+    self.go_around[go_around_games] += 1
+
+    self.whose_turn[games] = (players + 1) % self.num_players
+
+    # Check if the games whose round ended are over, otherwise start the next round
+    ended = games[round_over]
+    if self.single_round:
+      self.active[ended] = False
+      return
+    game_over = (self.scores[ended] >= self.threshhold).any(1)
+    self.active[ended[game_over]] = False
+    self.new_round(ended[~game_over])
+
+  def play(self):
+    '''
+    Plays every game until someone goes over the threshhold and returns a BatchResult.
+    '''
+    self.new_round(numpy.arange(self.num_games))
+    while self.active.any():
+      self.step()
+    games, rounds, go_around, averages = (numpy.concatenate(column) for column in zip(*self.records))
+    self.records = []
+    self.trajectories.flush()
+    # Average each game's go around totals over its number of rounds, then add up across games
+    kept = go_around < MAX_GO_AROUNDS
+    score_counts = numpy.bincount(go_around[kept], weights=averages[kept]/self.round_count[games[kept]], minlength=MAX_GO_AROUNDS)
+    go_arounds = (games, rounds, go_around, averages) if self.keep_go_arounds else None
+    return BatchResult(self.scores.copy(), self.scores >= self.threshhold, self.round_count.copy(), score_counts, go_arounds, self.trajectories)
+
+
+def play_games(strategies, num_games, rng=None, batch_size=10000, seeds=None, **kwargs):
+  '''
+  Plays num_games games in batches of batch_size and returns the merged BatchResult.
+  Extra keyword arguments are passed to BatchGame.
+  '''
+  rng = rng if rng is not None else numpy.random.default_rng()
+  results = []
+  for start in range(0, num_games, batch_size):
+    size = min(batch_size, num_games - start)
+    batch_seeds = seeds[start:start+size] if seeds is not None else None
+    game = BatchGame(strategies, size, rng, seeds=batch_seeds, **kwargs)
+    results.append(game.play())
+  return BatchResult.merge(results)
+
+
+if __name__ == '__main__':
+  all_basic_strategies = ['basic','basic','basic','basic']
+  all_intermediate_strategies = ['intermediate','intermediate','intermediate','intermediate']
+  all_expert_strategies = ['expert','expert','expert','expert']
+  basic_vs_intermediate = ['basic','intermediate','intermediate','intermediate']
+  basic_vs_expert = ['basic','expert','expert','expert']
+  intermediate_vs_basic = ['intermediate','basic','basic','basic']
+  intermediate_vs_expert = ['intermediate','expert','expert','expert']
+  expert_vs_basic = ['expert','basic','basic','basic']
+  expert_vs_intermediate = ['expert','intermediate','intermediate','intermediate']
+  strategies = [all_basic_strategies, all_intermediate_strategies, all_expert_strategies, basic_vs_intermediate, basic_vs_expert, intermediate_vs_basic, intermediate_vs_expert, expert_vs_basic, expert_vs_intermediate]
+
+  for matchup in strategies:
+    result = play_games(matchup, 10000)
+    print(','.join(matchup))
+    for number in range(len(matchup)):
+      print('player_' + str(number+1) + ' win ratio: ' + str(result.wins[number]*1./result.num_games))
+    print('')
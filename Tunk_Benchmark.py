@@ -0,0 +1,300 @@
+'''
+Benchmarks of the simulator hot paths.
+
+Every benchmark plays a fixed amount of work from fixed seeds and reports its best throughput
+over a few repeats (shuffles, turns, scorings or games per second) and the peak memory
+traced by tracemalloc in one more, traced run (worker processes of the tournament benchmark are not traced).
+Results are compared with the stored baselines and any throughput more than the tolerance
+below its baseline, or peak memory more than the tolerance above it, is reported as a
+regression and makes the run exit with status 1. Baselines depend on the machine, save
+new ones with --save after a change that is meant to move them.
+
+With --profile a benchmark is run under cProfile and its time is split into the phases of
+a turn: tunk decision, discard selection, draw decision, logging and scoring.
+
+  python Tunk_Benchmark.py [--only name ...] [--scale 0.1] [--repeat 3] [--save] [--tolerance 0.3] [--profile name]
+'''
+
+import argparse
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+
+import numpy
+
+import Tunk_Batch
+import Tunk_Checkpoint
+import Tunk_Events
+import Tunk_Seeding
+import Tunk_Simulator
+import Tunk_Strategies
+import Tunk_Tournament
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baselines.json')
+TOLERANCE = 0.3
+REPEAT = 3
+ROOT_SEED = 2024
+
+MATCHUPS = {
+  'basic': ['basic','basic','basic','basic'],
+  'intermediate': ['intermediate','intermediate','intermediate','intermediate'],
+  'expert': ['expert','expert','expert','expert'],
+  'basic_vs_expert': ['basic','expert','expert','expert'],
+  'counting_vs_expert': ['counting','expert','expert','expert'],
+}
+
+
+def seeds(count, stream):
+  return [int(seed) for seed in Tunk_Seeding.game_seeds(ROOT_SEED, numpy.arange(count), stream=(stream,))]
+
+
+def bench_deck(scale):
+  '''
+  Deck construction, one shuffle and drawing the whole deck.
+  '''
+  count = int(50000*scale)
+  for seed in seeds(count, 0):
+    deck = Tunk_Simulator.Deck(seed)
+    deck.shuffle(1)
+    for card in range(deck.size):
+      deck.draw()
+  return {'shuffles': count}
+
+
+def start_round(game):
+  game.round_count += 1
+  game.round_over = False
+  game.deck.shuffle(game.round_count)
+  game.discard_pile.reset()
+  game.deal()
+  game.discard_pile.push(game.deck.draw())
+  game.shown = 1 << game.discard_pile.top()
+
+
+def bench_take_turn(strategy, scale):
+  '''
+  take_turn of one strategy in every seat, round after round.
+  '''
+  count = int(200000*scale)
+  game = Tunk_Simulator.Game([strategy]*4, seed=seeds(1, 1)[0])
+  turns = 0
+  while turns < count:
+    start_round(game)
+    while not game.round_over and turns < count:
+      game.take_turn(game.whose_turn)
+      game.whose_turn = game.next_player(game.whose_turn)
+      turns += 1
+  return {'turns': turns}
+
+
+def bench_scoring(scale):
+  '''
+  call_tunk and end_round on dealt hands.
+  '''
+  count = int(100000*scale)
+  game = Tunk_Simulator.Game(MATCHUPS['basic'], seed=seeds(1, 2)[0])
+  scorings = 0
+  while scorings < count:
+    start_round(game)
+    for player in game.players:
+      game.call_tunk(player)
+      game.end_round()
+      scorings += 2
+  return {'scorings': scorings}
+
+
+def bench_play_game(strategies, scale, events=False):
+  '''
+  Whole games in the scalar engine, with the binary event log if events.
+  '''
+  count = max(int(500*scale), 1)
+  sink = Tunk_Events.BinaryEventSink() if events else None
+  turns = 0
+  for game_id, seed in enumerate(seeds(count, 3)):
+    if sink is not None:
+      sink.chunks = []  # Keep memory flat, the records themselves are not needed
+    game = Tunk_Simulator.Game(strategies, events=sink, game_id=game_id, seed=seed)
+    game.play_game()
+    turns += game.turn_count
+  return {'games': count, 'turns': turns}
+
+
+def bench_batch(strategies, scale):
+  '''
+  Whole games in the batch engine.
+  '''
+  count = max(int(10000*scale), 1)
+  game = Tunk_Batch.BatchGame(strategies, count, seeds=Tunk_Seeding.game_seeds(ROOT_SEED, numpy.arange(count), stream=(4,)))
+  game.play()
+  return {'games': count, 'turns': game.turn_count}
+
+
+def bench_tournament(scale):
+  '''
+  The nine Tunk_Tournament matchups on every core.
+  '''
+  count = max(int(2000*scale), 1)
+  matchups = list(Tunk_Tournament.MATCHUPS.values())
+  Tunk_Tournament.run_tournament(matchups, count, seed=ROOT_SEED)
+  return {'games': count*len(matchups)}
+
+
+BENCHMARKS = {'deck': bench_deck, 'scoring': bench_scoring, 'tournament': bench_tournament}
+for name in ('basic', 'intermediate', 'expert', 'counting'):
+  BENCHMARKS['take_turn_' + name] = (lambda name: lambda scale: bench_take_turn(name, scale))(name)
+for name, strategies in MATCHUPS.items():
+  BENCHMARKS['play_game_' + name] = (lambda strategies: lambda scale: bench_play_game(strategies, scale))(strategies)
+  BENCHMARKS['batch_' + name] = (lambda strategies: lambda scale: bench_batch(strategies, scale))(strategies)
+BENCHMARKS['play_game_expert_logged'] = lambda scale: bench_play_game(MATCHUPS['expert'], scale, events=True)
+
+
+def run_benchmark(name, scale=1., memory=True, repeat=REPEAT):
+  '''
+  Runs one benchmark repeat times and returns its metrics from the fastest run:
+  <unit>_per_sec for every unit of work, seconds and (with memory) peak_memory in bytes.
+  '''
+  seconds = None
+  for run in range(repeat):
+    start = time.perf_counter()
+    counts = BENCHMARKS[name](scale)
+    elapsed = time.perf_counter() - start
+    if seconds is None or elapsed < seconds:
+      seconds = elapsed
+  metrics = dict((unit + '_per_sec', count/seconds) for unit, count in counts.items())
+  metrics['seconds'] = seconds
+  if memory:
+    tracemalloc.start()
+    BENCHMARKS[name](scale)
+    metrics['peak_memory'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+  return metrics
+
+
+def load_baselines(path=BASELINE_PATH):
+  if not os.path.exists(path):
+    return {}
+  with open(path) as fh:
+    return json.load(fh)
+
+
+def save_baselines(baselines, path=BASELINE_PATH):
+  Tunk_Checkpoint.write_json(path, baselines, indent=2, sort_keys=True)
+
+
+def regressions(name, metrics, baseline, tolerance=TOLERANCE):
+  '''
+  Messages for every metric of a benchmark that is worse than its baseline by more than tolerance.
+  '''
+  found = []
+  for metric, value in metrics.items():
+    if metric not in baseline or metric == 'seconds':
+      continue
+    if metric == 'peak_memory':
+      if value > baseline[metric]*(1 + tolerance):
+        found.append(name + ' ' + metric + ' ' + str(int(value)) + ' is above the baseline ' + str(int(baseline[metric])))
+    elif value < baseline[metric]*(1 - tolerance):
+      found.append(name + ' ' + metric + ' %.1f is below the baseline %.1f' % (value, baseline[metric]))
+  return found
+
+
+def phase_functions():
+  '''
+  The functions whose time counts towards each phase of a turn, as cProfile keys.
+  '''
+  def key(function):
+    code = function.__code__
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+  phases = {'tunk decision': [], 'discard selection': [key(Tunk_Batch.Turn.__init__)], 'draw decision': [],
+            'logging': [], 'scoring': []}
+  decisions = {'call_tunk': 'tunk decision', 'call_tunk_batch': 'tunk decision', 'discard': 'discard selection',
+               'discard_batch': 'discard selection', 'draw': 'draw decision', 'draw_batch': 'draw decision'}
+  classes = set(Tunk_Strategies.STRATEGIES.values()) | set([Tunk_Strategies.Strategy])
+  for cls in classes:
+    for (name, phase) in decisions.items():
+      if isinstance(cls, type) and name in cls.__dict__:
+        phases[phase].append(key(cls.__dict__[name]))
+  for cls in (Tunk_Events.EventSink, Tunk_Events.BinaryEventSink):
+    for function in cls.__dict__.values():
+      if callable(function) and hasattr(function, '__code__'):
+        phases['logging'].append(key(function))
+  for function in (Tunk_Simulator.Game.call_tunk, Tunk_Simulator.Game.end_round, Tunk_Simulator.Game.is_game_over,
+                   Tunk_Batch.BatchGame.score_round):
+    phases['scoring'].append(key(function))
+  return phases
+
+
+def profile_phases(name, scale=1., stats_path=None):
+  '''
+  Runs a benchmark under cProfile and returns (total seconds, {phase: seconds}).
+  Time spent in a phase function called from another function of the same phase is only counted once.
+  The raw profile is written to stats_path if given.
+  '''
+  profiler = cProfile.Profile()
+  profiler.enable()
+  BENCHMARKS[name](scale)
+  profiler.disable()
+  if stats_path is not None:
+    profiler.dump_stats(stats_path)
+  stats = pstats.Stats(profiler).stats
+  total = sum(entry[2] for entry in stats.values())
+  times = {}
+  for (phase, functions) in phase_functions().items():
+    functions = set(functions)
+    phase_time = 0.
+    for function in functions:
+      if function not in stats:
+        continue
+      (calls, primitive_calls, own_time, cumulative_time, callers) = stats[function]
+      inside = sum(caller_stats[3] for caller, caller_stats in callers.items() if caller in functions)
+      phase_time += cumulative_time - inside
+    times[phase] = phase_time
+  return (total, times)
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Benchmarks of the Tunk simulator')
+  parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='benchmarks to run, all by default')
+  parser.add_argument('--scale', type=float, default=1., help='multiplies the work of every benchmark')
+  parser.add_argument('--repeat', type=int, default=REPEAT, help='runs of every benchmark, the fastest one counts')
+  parser.add_argument('--save', action='store_true', help='store the results as the new baselines')
+  parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed fraction worse than the baseline')
+  parser.add_argument('--no-memory', action='store_true', help='skip the traced peak memory runs')
+  parser.add_argument('--profile', choices=sorted(BENCHMARKS), help='profile one benchmark by phase instead')
+  parser.add_argument('--stats', help='with --profile, also write the raw cProfile stats here')
+  args = parser.parse_args()
+
+  if args.profile:
+    (total, times) = profile_phases(args.profile, args.scale, args.stats)
+    print('%-20s %9s %7s' % ('phase', 'seconds', 'share'))
+    for phase, seconds in sorted(times.items(), key=lambda item: -item[1]):
+      print('%-20s %9.3f %6.1f%%' % (phase, seconds, 100*seconds/total))
+    other = total - sum(times.values())
+    print('%-20s %9.3f %6.1f%%' % ('other', other, 100*other/total))
+    sys.exit(0)
+
+  baselines = load_baselines()
+  found = []
+  for name in args.only or sorted(BENCHMARKS):
+    metrics = run_benchmark(name, args.scale, not args.no_memory, args.repeat)
+    rates = ', '.join('%s %.1f' % (metric, value) for metric, value in sorted(metrics.items()) if metric.endswith('_per_sec'))
+    memory = ', peak memory %.1f MB' % (metrics['peak_memory']/1e6) if 'peak_memory' in metrics else ''
+    print('%-28s %s%s (%.2f s)' % (name, rates, memory, metrics['seconds']))
+    if args.scale == 1. and name in baselines:
+      found += regressions(name, metrics, baselines[name], args.tolerance)
+    if args.save:
+      baselines[name] = metrics
+  if args.save:
+    if args.scale != 1.:
+      sys.exit('Baselines are only saved for --scale 1')
+    save_baselines(baselines)
+  if found:
+    print('\nREGRESSIONS:')
+    for message in found:
+      print('  ' + message)
+    sys.exit(1)
@@ -0,0 +1,217 @@
+'''
+Command line and Python entry point of tournaments, so an experiment is a spec instead of
+an edit to a __main__ block.
+
+A spec is a dict (or a json file of one) with:
+  matchups        - the matchups to play, each like "expert,basic,basic,basic" or a list of names
+  games           - games per matchup, one count or one per matchup (GAMES by default)
+  precision       - if given, play each matchup until its win ratios are known to +/- precision
+                    (Tunk_Tournament.run_adaptive_tournament), with games as the most it plays
+  workers, seed, shard_size, results_dir, checkpoint - as in Tunk_Tournament.run_tournament
+  rules           - Tunk_Rules fields, e.g. {"num_decks": 2}, one seat per strategy by default
+  beta, player_1_beta, tunk_call_value, threshhold - game parameters of the named strategies
+run_tournament(spec) plays it and returns the Tunk_Tournament.MatchupResults, and
+  ./tunk-sim expert,basic,basic,basic basic,expert,expert,expert -n 10000 --workers 8 --seed 1 --format json
+does the same from the shell (python Tunk_CLI.py takes the same arguments).
+Nothing but the standard library is imported until a run starts, and runs with one worker
+never import multiprocessing, so short runs start fast.
+'''
+
+import json
+import sys
+
+
+GAMES = 1000
+FORMATS = ('text', 'json', 'csv')
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+GAME_PARAMETERS = ('beta', 'player_1_beta', 'tunk_call_value', 'threshhold')
+# Spec field -> default
+SPEC_FIELDS = {
+  'matchups': None,
+  'games': GAMES,
+  'precision': None,
+  'workers': None,
+  'seed': None,
+  'shard_size': None,
+  'results_dir': None,
+  'checkpoint': None,
+  'rules': None,
+  'beta': None,
+  'player_1_beta': None,
+  'tunk_call_value': None,
+  'threshhold': None,
+}
+
+
+def parse_matchup(matchup):
+  '''
+  The strategy names of a matchup like "expert,basic,basic,basic", lists are returned as they are.
+  '''
+  if not isinstance(matchup, str):
+    return list(matchup)
+  names = [name.strip() for name in matchup.split(',')]
+  if len(names) < 2 or not all(names):
+    raise ValueError('A matchup is two or more comma separated strategy names, got ' + repr(matchup))
+  return names
+
+
+def full_spec(spec):
+  '''
+  The spec with defaults filled in and its matchups parsed, unknown fields are an error.
+  '''
+  unknown = [name for name in spec if name not in SPEC_FIELDS]
+  if unknown:
+    raise ValueError('Unknown spec fields: ' + ', '.join(sorted(unknown)))
+  full = dict(SPEC_FIELDS)
+  full.update((name, value) for name, value in spec.items() if value is not None)
+  if not full['matchups']:
+    raise ValueError('The spec has no matchups')
+  full['matchups'] = [parse_matchup(matchup) for matchup in full['matchups']]
+  if full['precision'] is not None and not isinstance(full['games'], int):
+    raise ValueError('Adaptive runs take one game count, the most any matchup plays')
+  return full
+
+
+def run_tournament(spec):
+  '''
+  Plays the tournament of a spec (see the module docstring) and returns a list of
+  Tunk_Tournament.MatchupResults in the order of its matchups, with .seed set on each.
+  '''
+  spec = full_spec(spec)
+  import Tunk_Rules
+  import Tunk_Tournament
+  matchups = spec['matchups']
+  kwargs = dict((name, spec[name]) for name in GAME_PARAMETERS + ('workers', 'seed', 'checkpoint') if spec[name] is not None)
+  if spec['shard_size'] is not None:
+    kwargs['shard_size'] = spec['shard_size']
+  if spec['rules'] is not None:
+    rules = dict(spec['rules'])
+    rules.setdefault('num_players', len(matchups[0]))
+    kwargs['rules'] = Tunk_Rules.Rules.from_dict(rules)
+  if any('optimal' in matchup for matchup in matchups):
+    import Tunk_Oracle
+    kwargs['oracle'] = Tunk_Oracle.load_oracle()
+  if spec['precision'] is not None:
+    if spec['results_dir'] is not None:
+      raise ValueError('Adaptive runs do not write results directories')
+    return Tunk_Tournament.run_adaptive_tournament(matchups, spec['precision'], max_games=spec['games'], **kwargs)
+  return Tunk_Tournament.run_tournament(matchups, spec['games'], results_dir=spec['results_dir'], **kwargs)
+
+
+def result_rows(results):
+  '''
+  One dict per seat of every result: matchup, seat, strategy, games, wins, losses, win_ratio, low, high.
+  '''
+  rows = []
+  for result in results:
+    ratios = result.win_ratios()
+    (low, high) = result.confidence_intervals()
+    for seat, strategy in enumerate(result.strategies):
+      rows.append({'matchup': ','.join(result.strategies), 'seat': seat + 1, 'strategy': strategy,
+                   'games': result.num_games, 'wins': int(result.wins[seat]), 'losses': int(result.losses[seat]),
+                   'win_ratio': float(ratios[seat]), 'low': float(low[seat]), 'high': float(high[seat])})
+  return rows
+
+
+def write_results(results, fh, output_format='text'):
+  '''
+  Writes the win ratios of every seat with their 95% confidence intervals as text, json or csv.
+  '''
+  if output_format not in FORMATS:
+    raise ValueError('Unknown output format: ' + str(output_format))
+  rows = result_rows(results)
+  if output_format == 'json':
+    matchups = []
+    for result in results:
+      found = {'strategies': result.strategies, 'seed': int(result.seed), 'num_games': result.num_games,
+               'seats': [row for row in rows if row['matchup'] == ','.join(result.strategies)]}
+      if hasattr(result, 'converged'):
+        found['converged'] = bool(result.converged)
+      matchups.append(found)
+    json.dump(matchups, fh, indent=2)
+    fh.write('\n')
+  elif output_format == 'csv':
+    import csv
+    writer = csv.DictWriter(fh, fieldnames=list(rows[0]) if rows else [], lineterminator='\n')
+    writer.writeheader()
+    writer.writerows(rows)
+  else:
+    for result in results:
+      fh.write(','.join(result.strategies) + ' (' + str(result.num_games) + ' games, seed ' + str(result.seed) + ')\n')
+      for row in rows:
+        if row['matchup'] == ','.join(result.strategies):
+          fh.write('  player_%d %-12s win ratio %.4f (%.4f, %.4f)\n' % (row['seat'], row['strategy'], row['win_ratio'], row['low'], row['high']))
+
+
+def parse_args(argv):
+  import argparse
+  parser = argparse.ArgumentParser(prog='tunk-sim', description='Plays tournaments of Tunk games.')
+  parser.add_argument('matchups', nargs='*', help='matchups like expert,basic,basic,basic')
+  parser.add_argument('--spec', help='json file with a spec, options given on the command line override it')
+  parser.add_argument('-n', '--games', type=int, help='games per matchup (default %d)' % GAMES)
+  parser.add_argument('--precision', type=float, help='play until every win ratio is known to +/- this, at most --games games')
+  parser.add_argument('-w', '--workers', type=int, help='worker processes (default all cores)')
+  parser.add_argument('--seed', type=int, help='root seed, random if not given')
+  parser.add_argument('--shard-size', type=int, help='games per shard')
+  parser.add_argument('--results-dir', help='write every game and go around to this Tunk_Results directory')
+  parser.add_argument('--checkpoint', help='save progress to this directory and resume from it')
+  parser.add_argument('--rule', action='append', default=[], metavar='NAME=VALUE', help='table rule, e.g. --rule num_decks=2')
+  for name in GAME_PARAMETERS:
+    parser.add_argument('--' + name.replace('_', '-'), type=int)
+  parser.add_argument('-f', '--format', choices=FORMATS, default='text', help='output format (default text)')
+  parser.add_argument('-o', '--output', help='file to write the results to (default stdout)')
+  parser.add_argument('--log-level', choices=LOG_LEVELS, default='WARNING', help='logging level of progress messages on stderr')
+  args = parser.parse_args(argv)
+
+  spec = {}
+  if args.spec is not None:
+    with open(args.spec) as fh:
+      spec = json.load(fh)
+  if args.matchups:
+    spec['matchups'] = args.matchups
+  for name in ('games', 'precision', 'workers', 'seed', 'shard_size', 'results_dir', 'checkpoint') + GAME_PARAMETERS:
+    if getattr(args, name) is not None:
+      spec[name] = getattr(args, name)
+  if args.rule:
+    rules = dict(spec.get('rules') or {})
+    for rule in args.rule:
+      (name, equals, value) = rule.partition('=')
+      if not equals or not value.lstrip('-').isdigit():
+        parser.error('--rule takes NAME=VALUE with an integer value, got ' + rule)
+      rules[name] = int(value)
+    spec['rules'] = rules
+  if not spec.get('matchups'):
+    parser.error('give at least one matchup, or a --spec with matchups')
+  return (args, spec)
+
+
+def main(argv=None):
+  '''
+  Runs tunk-sim with the given arguments (sys.argv by default), returns the exit status.
+  '''
+  (args, spec) = parse_args(sys.argv[1:] if argv is None else argv)
+  import logging
+  import time
+  logging.basicConfig(level=getattr(logging, args.log_level), format='%(asctime)s %(levelname)s %(message)s', stream=sys.stderr)
+  log = logging.getLogger('tunk-sim')
+  log.debug('spec: %s', json.dumps(spec, sort_keys=True))
+  log.info('playing %d matchup(s)', len(spec['matchups']))
+  start = time.time()
+  try:
+    results = run_tournament(spec)
+  except ValueError as error:
+    log.error('%s', error)
+    return 2
+  seconds = time.time() - start
+  games = sum(result.num_games for result in results)
+  log.info('played %d games in %.2f s (%.0f games/s)', games, seconds, games/max(seconds, 1e-9))
+  if args.output is None:
+    write_results(results, sys.stdout, args.format)
+  else:
+    with open(args.output, 'w') as fh:
+      write_results(results, fh, args.format)
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
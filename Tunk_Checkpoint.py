@@ -0,0 +1,161 @@
+'''
+Checkpoints of long tournament and sweep runs.
+
+A run given a checkpoint directory saves its progress there as it goes: the spec of the
+run (strategies, game counts, root seed, shard size and game parameters), which shards
+are done and the merged counts of those shards. Every game's seed is a function of the
+root seed and the game's place in the run (see Tunk_Seeding), so the root seed and the
+progress counters are the whole random state of a run, and a resumed run plays exactly
+the games that were not finished, with the same seeds, and ends with the same results
+as a run that was never stopped.
+
+checkpoint.json is written to a temporary file, synced and renamed over the old one
+(replace_file, which the other modules use for the files they replace too), so a run
+killed at any moment leaves a whole checkpoint behind. Arrays too big for json (the
+trajectory statistics of a tournament) go to a new .npz file on every save. Results of a Tunk_Results
+directory written after the last checkpoint belong to shards that are played again, so
+resuming first drops the chunks written since then. Sweeps stream the losers of every
+game into losers.npy in the checkpoint directory.
+
+  python Tunk_Checkpoint.py <checkpoint directory> [workers]
+resumes a run and prints its results.
+'''
+
+import json
+import os
+import sys
+import time
+
+import numpy
+
+
+CHECKPOINT_FILE = 'checkpoint.json'
+CHECKPOINT_INTERVAL = 30.   # Seconds between checkpoints of a running run
+
+
+def replace_file(path, write, binary=False):
+  '''
+  Replaces path in one step with what write(fh) writes to a synced temporary file, so the
+  file is never left half written, even if the machine goes down.
+  '''
+  temp_path = os.path.join(os.path.dirname(path) or '.', '.' + os.path.basename(path) + '.tmp')
+  with open(temp_path, 'wb' if binary else 'w') as fh:
+    write(fh)
+    fh.flush()
+    os.fsync(fh.fileno())
+  os.replace(temp_path, path)
+
+
+def write_json(path, data, **options):
+  '''
+  Replaces path with data as json in one step, options are passed to json.dump.
+  '''
+  replace_file(path, lambda fh: json.dump(data, fh, **options))
+
+
+class Checkpoint:
+  '''
+  The checkpoint of one run in a directory.
+  state is a json-able dict: kind and spec of the run plus whatever progress the runner keeps in it.
+  '''
+  def __init__(self, directory, interval=None):
+    self.directory = directory
+    self.path = os.path.join(directory, CHECKPOINT_FILE)
+    self.interval = interval if interval is not None else CHECKPOINT_INTERVAL
+    self.last_save = time.time()
+    self.state = None
+    os.makedirs(directory, exist_ok=True)
+
+  def exists(self):
+    return os.path.exists(self.path)
+
+  def load(self):
+    with open(self.path) as fh:
+      return json.load(fh)
+
+  def saved_seed(self):
+    '''
+    Root seed of the saved run, None if nothing is saved yet.
+    '''
+    return self.load()['spec']['seed'] if self.exists() else None
+
+  def start(self, kind, spec, progress):
+    '''
+    Returns the saved state of the run, or a new state with the given progress if there is none.
+    Raises ValueError if the directory holds the checkpoint of a different run.
+    '''
+    if self.exists():
+      state = self.load()
+      if state['kind'] != kind or state['spec'] != json.loads(json.dumps(spec)):
+        raise ValueError(self.directory + ' holds the checkpoint of a different ' + state['kind'] + ' run')
+      self.state = state
+    else:
+      self.state = dict(kind=kind, spec=spec, finished=False, **progress)
+      self.save()
+    return self.state
+
+  def due(self):
+    return time.time() - self.last_save >= self.interval
+
+  def save(self, arrays=None, **progress):
+    '''
+    Updates the state with progress and writes it out. arrays (a dict of numpy arrays) are
+    written to a new .npz file that the state points to, so the two always match.
+    '''
+    old_arrays = self.state.get('arrays')
+    if arrays is not None:
+      saves = self.state.get('saves', 0) + 1
+      name = 'arrays_%06d.npz' % saves
+      replace_file(os.path.join(self.directory, name), lambda fh: numpy.savez_compressed(fh, **arrays), binary=True)
+      progress.update(arrays=name, saves=saves)
+    self.state.update(progress)
+    write_json(self.path, self.state)
+    self.last_save = time.time()
+    if arrays is not None and old_arrays is not None:
+      os.remove(os.path.join(self.directory, old_arrays))
+
+  def load_arrays(self):
+    '''
+    The arrays of the last save as a dict, empty if none were saved.
+    '''
+    if self.state.get('arrays') is None:
+      return {}
+    with numpy.load(os.path.join(self.directory, self.state['arrays'])) as data:
+      return dict((name, data[name]) for name in data.files)
+
+
+def resume(directory, workers=None, **kwargs):
+  '''
+  Resumes the run saved in directory and returns its results, like the run would have.
+  Extra keyword arguments are passed to the run, they are needed for the parameters not
+  stored with it (Tunk_Tournament.UNSTORED_PARAMS, the oracle of 'optimal' runs is loaded
+  if not given).
+  '''
+  import Tunk_Sweep
+  import Tunk_Tournament
+  checkpoint = Checkpoint(directory)
+  if not checkpoint.exists():
+    raise ValueError('There is no checkpoint in ' + directory)
+  state = checkpoint.load()
+  spec = dict(state['spec'])
+  params = Tunk_Tournament.params_kwargs(spec.pop('params'))
+  strategies = spec['matchups'] if 'matchups' in spec else [spec['strategies']]
+  if 'oracle' not in kwargs and any('optimal' in matchup for matchup in strategies):
+    import Tunk_Oracle
+    kwargs['oracle'] = Tunk_Oracle.load_oracle()
+  runs = {'tournament': Tunk_Tournament.run_tournament, 'adaptive': Tunk_Tournament.run_adaptive_tournament,
+          'sweep': Tunk_Sweep.run_sweep}
+  return runs[state['kind']](workers=workers, checkpoint=directory, **dict(spec, **dict(params, **kwargs)))
+
+
+if __name__ == '__main__':
+  directory = sys.argv[1]
+  workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+  kind = Checkpoint(directory).load()['kind']
+  results = resume(directory, workers)
+  if kind == 'sweep':
+    results.write(sys.stdout)
+  else:
+    for result in results:
+      print(','.join(result.strategies) + ' (' + str(result.num_games) + ' games): ' +
+            ', '.join(str(ratio) for ratio in result.win_ratios()))
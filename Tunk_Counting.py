@@ -0,0 +1,260 @@
+'''
+Card counting: what a player can work out about the cards they can't see.
+
+Every card turned face up in a round (the first top card and every discard) is public. The
+game keeps them as a bit mask of card ids, game.shown in Tunk_Simulator and one row of
+game.shown per game in Tunk_Batch, and a reshuffle (see Tunk_Rules) takes the cards it puts
+back into the deck out of it. From the seat of a player:
+  - the cards of an opponent's hand that are shown were taken from the discard pile, so they
+    are known, the rest of the opponent's hand is unknown
+  - the unseen cards are the cards neither shown nor in the player's own hand, the deck and
+    the unknown cards of the opponents. Every unseen card is equally likely to be the next
+    card drawn from the deck or any one of an opponent's unknown cards.
+An opponent's hand is then worth its known cards plus k cards drawn without replacement from
+the unseen cards. The number of ways k unseen cards can be worth less than t is counted
+exactly from how many unseen cards there are of each value: it is the coefficient of x^k in
+  product over values v of (sum over i of C(count of v, i) x^i y^(v*i))
+summed over the powers of y below t. Only sums below the highest hand value a counting
+strategy calls tunk with matter, so the polynomials are cut off there. The scalar engine
+packs them into Python ints, one digit per coefficient just wide enough for the largest
+count, and multiplies in the few terms of each card value's polynomial as shifts of the
+product, the batch engine runs the same product as array operations, and both divide the
+same exact counts by the same table of binomials, so they make the same decisions for the
+same seeds.
+
+CardCounter(rules, max_value) holds the tables for a table's rules, card_counter() makes
+each one once. The 'counting' strategy (Tunk_Strategies.CountingStrategy) uses it for its
+draw and tunk call decisions.
+'''
+
+import math
+
+import numpy
+
+import Tunk_Rules
+
+
+NUM_VALUES = Tunk_Rules.MAX_CARD_VALUE + 1
+MAX_VALUE = 30    # Highest hand value counted, the counts up to it stay below 2**53 (exact as floats) for any rules
+
+COUNTERS = {}   # (rules, max_value) -> CardCounter
+
+
+def card_counter(rules, max_value):
+  '''
+  The CardCounter of the given rules and highest hand value, made the first time it is asked for.
+  '''
+  key = (rules, max_value)
+  if key not in COUNTERS:
+    COUNTERS[key] = CardCounter(rules, max_value)
+  return COUNTERS[key]
+
+
+class CardCounter:
+  '''
+  Tables for counting the cards of games played with rules, for hands worth up to max_value.
+    value_masks  - bit mask of the card ids of each value
+    choose       - C(n, k) as floats for every n up to the deck size and k up to the hand size
+    choose_ints  - C(n, i) as ints for every n up to the most cards of one value
+    terms        - terms[v][n] are the terms of the packed polynomial of n unseen cards of value v,
+                   with digit_bits bits per coefficient and block digits per power of x
+  '''
+  def __init__(self, rules, max_value):
+    if not 0 <= max_value <= MAX_VALUE:
+      raise ValueError('max_value must be between 0 and ' + str(MAX_VALUE) + ', got ' + str(max_value))
+    self.rules = rules
+    self.max_value = max_value
+    self.limit = limit = max_value + 1   # Sums counted, 0 to max_value
+    self.hand_size = hand_size = rules.hand_size
+    self.card_values = rules.card_values
+    self.all_cards = (1 << rules.deck_size) - 1
+    self.value_masks = [0]*NUM_VALUES
+    for card, value in enumerate(rules.card_values):
+      self.value_masks[value] |= 1 << card
+    most = max(bin(mask).count('1') for mask in self.value_masks)
+    self.choose = [[float(math.comb(n, k)) for k in range(hand_size + 1)] for n in range(rules.deck_size + 1)]
+    self.choose_ints = [[math.comb(n, i) for i in range(hand_size + 1)] for n in range(most + 1)]
+
+    # A block of limit digits per power of x. No digit (or running sum of digits) ever counts more than the
+    # ways with every card unseen, so digits as wide as the largest of those never carry into each other.
+    self.block = limit
+    bits = self.digit_bits = max(count.bit_length() for count in self.full_counts(limit))
+    self.digit_mask = (1 << bits) - 1
+    # masks[k][b] keeps the powers of x up to k and of y below b
+    self.masks = [[sum(self.digit_mask << ((j*limit + s)*bits) for j in range(k + 1) for s in range(below)) for below in range(limit + 1)]
+                  for k in range(hand_size + 1)]
+    self.prefix = sum(1 << (s*bits) for s in range(limit))   # Multiplying by it turns every digit into the sum of the digits up to it
+    # (coefficient, power of x, power of y, shift) of the terms of every packed polynomial, but its constant 1
+    self.terms = [[[(self.choose_ints[n][i], i, value*i, (i*limit + value*i)*bits) for i in range(1, min(n, hand_size) + 1) if value*i < limit]
+                   for n in range(most + 1)] for value in range(NUM_VALUES)]
+
+    # Batch tables, card columns grouped by value
+    self.value_lookup = numpy.array(rules.card_values, dtype=numpy.int64)
+    self.value_order = numpy.argsort(self.value_lookup, kind='stable')
+    self.value_starts = numpy.searchsorted(self.value_lookup[self.value_order], numpy.arange(NUM_VALUES))
+    self.choose_table = numpy.array(self.choose)
+    self.count_dtype = numpy.int32 if bits < 32 else numpy.int64   # Holds any count, like the digits
+    self.choose_int_table = numpy.array(self.choose_ints, dtype=self.count_dtype).T.copy()   # [i, n]
+
+  def full_counts(self, limit):
+    '''
+    Running sums over the sums below limit of the ways up to hand_size cards of the whole deck add up to each sum.
+    '''
+    ways = [[1] + [0]*(limit - 1)] + [[0]*limit for j in range(self.hand_size)]
+    for value, mask in enumerate(self.value_masks):
+      count = bin(mask).count('1')
+      found = [list(row) for row in ways]
+      for i in range(1, min(count, self.hand_size) + 1):
+        for j in range(i, self.hand_size + 1):
+          for s in range(value*i, limit):
+            found[j][s] += math.comb(count, i)*ways[j - i][s - value*i]
+      ways = found
+    return [sum(row[:s + 1]) for row in ways for s in range(limit)]
+
+  # Scalar engine
+
+  def unseen(self, game, hand_mask):
+    '''
+    Bit mask of the cards a player holding hand_mask has not seen this round.
+    '''
+    return self.all_cards & ~game.shown & ~hand_mask
+
+  def value_counts(self, unseen):
+    return [(unseen & mask).bit_count() for mask in self.value_masks]
+
+  def value_total(self, unseen):
+    '''
+    (number of unseen cards, their total value)
+    '''
+    counts = self.value_counts(unseen)
+    return (sum(counts), sum(value*count for value, count in enumerate(counts)))
+
+  def opponents(self, game, player):
+    '''
+    (value of the known cards, number of unknown cards) of every opponent of player, in
+    turn order from the player's left.
+    '''
+    shown = game.shown
+    card_values = self.card_values
+    found = []
+    players = game.players
+    for offset in range(1, len(players)):
+      other = players[(player.number + offset) % len(players)]
+      known = other.hand_mask & shown
+      value = 0
+      if known:
+        for card in other.hand:
+          if known >> card & 1:
+            value += card_values[card]
+      found.append((value, len(other.hand) - known.bit_count()))
+    return found
+
+  def ways_below(self, counts, cards, below):
+    '''
+    Packed numbers of ways up to cards unseen cards add up to each sum below the given one,
+    read with ways(): counts is the number of unseen cards of each value.
+    '''
+    masks = self.masks
+    terms = self.terms
+    product = 1
+    for value in range(min(below, NUM_VALUES)):
+      found = product
+      for (coefficient, power, shift_value, shift) in terms[value][counts[value]]:
+        if power > cards or shift_value >= below:
+          break
+        # Only the digits that stay within the powers of x and y kept are moved up
+        found += coefficient*((product & masks[cards - power][below - shift_value]) << shift)
+      product = found
+    return product
+
+  def ways(self, packed, cards, below):
+    '''
+    Number of ways the given number of cards can be worth less than below.
+    '''
+    bits = self.digit_bits
+    block = (packed >> (cards*self.block*bits)) & self.masks[0][below]
+    return ((block*self.prefix) >> ((below - 1)*bits)) & self.digit_mask
+
+  def win_probability(self, game, player, hand_value):
+    '''
+    Chance that no opponent's hand is worth less than hand_value (at most max_value), the
+    chance a tunk call wins if the opponents' unknown cards are independent of each other.
+    '''
+    opponents = self.opponents(game, player)
+    below = 0
+    cards = 0
+    for (known_value, unknown) in opponents:
+      if hand_value - known_value > below:
+        below = hand_value - known_value
+      if unknown > cards:
+        cards = unknown
+    if below <= 0:   # Every opponent's known cards are already worth as much
+      return 1.
+    counts = self.value_counts(self.unseen(game, player.hand_mask))
+    unseen = sum(counts)
+    packed = self.ways_below(counts, cards, below)
+    probability = 1.
+    for (known_value, unknown) in opponents:
+      if hand_value - known_value > 0:
+        probability *= 1. - float(self.ways(packed, unknown, hand_value - known_value))/self.choose[unseen][unknown]
+    return probability
+
+  # Batch engine, game is a Tunk_Batch.BatchGame playing with game.counting set
+
+  def unseen_batch(self, game, games, hands):
+    '''
+    (rows, deck size) True for the cards not seen by the players holding hands in the given games.
+    '''
+    rows = numpy.arange(len(games))
+    unseen = ~game.shown[games]
+    unseen[rows[:, None], hands] = False
+    return unseen[:, :game.deck_size]
+
+  def value_counts_batch(self, unseen):
+    return numpy.add.reduceat(unseen[:, self.value_order], self.value_starts, axis=1, dtype=numpy.int64)
+
+  def value_total_batch(self, unseen):
+    return (unseen.sum(1), unseen.astype(numpy.int64) @ self.value_lookup)
+
+  def ways_below_batch(self, counts, cards, below):
+    '''
+    The numbers of ways_below for every row of counts, as a (cards + 1, below, rows) array of
+    the ways j cards can be worth s or less. The rows are the last axis so every step of the
+    product adds up whole rows at a time.
+    '''
+    ways = numpy.zeros((cards + 1, below, len(counts)), dtype=self.count_dtype)
+    ways[0, 0] = 1
+    counts = counts.T
+    for value in range(min(below, NUM_VALUES)):
+      coefficients = self.choose_int_table[:, counts[value]]
+      for j in range(cards, 0, -1):   # Down from the most cards, so ways[j - i] still holds the product before this value
+        for i in range(1, j + 1):
+          if value*i >= below:
+            break
+          ways[j, value*i:] += coefficients[i]*ways[j - i, :below - value*i]
+    return numpy.cumsum(ways, axis=1, out=ways)
+
+  def win_probability_batch(self, game, games, players, hand_values):
+    '''
+    win_probability of the given players of the given games, hand values at most max_value.
+    '''
+    rows = numpy.arange(len(games))
+    num_players = game.num_players
+    hands = game.hands[games]
+    card_values = game.value_lookup[hands]
+    known = numpy.take_along_axis(game.shown[games], hands.reshape(len(games), -1), axis=1).reshape(hands.shape) & (hands >= 0)
+    known_values = (card_values*known).sum(2)
+    unknown = (hands >= 0).sum(2) - known.sum(2)
+    unseen = self.unseen_batch(game, games, hands[rows, players])
+    counts = self.value_counts_batch(unseen)
+    total = unseen.sum(1)
+    cumulative = self.ways_below_batch(counts, int(unknown.max(initial=0)), max(int(hand_values.max(initial=0)), 1))
+    probability = numpy.ones(len(games))
+    for offset in range(1, num_players):
+      others = (players + offset) % num_players
+      below = hand_values - known_values[rows, others]
+      cards = unknown[rows, others]
+      counted = numpy.flatnonzero(below > 0)
+      ways = cumulative[cards[counted], below[counted] - 1, counted]
+      probability[counted] *= 1. - ways/self.choose_table[total[counted], cards[counted]]
+    return probability
@@ -0,0 +1,175 @@
+'''
+Event sinks for the turn by turn log of Tunk_Simulator games.
+
+A Game only reports events when it is given a sink, so unlogged games pay nothing.
+BinaryEventSink stores every event as a fixed width record in a preallocated numpy
+array and writes it out in bulk when the buffer fills up. render_transcript turns
+those records back into the text transcript the simulator used to write while playing.
+Games played with other rules (see Tunk_Rules) need records sized for them, pass the
+rules to the sink and to read_events/render_transcript.
+'''
+
+import sys
+
+import numpy
+
+import Tunk_Rules
+
+
+# Record kinds
+ROUND_START = 0
+TURN = 1
+GO_AROUND = 2
+GAME_OVER = 3
+
+# Where the card drawn in a TURN record came from, tunk calls and empty decks end the round without a draw
+SOURCE_DECK = 0
+SOURCE_DISCARD_PILE = 1
+SOURCE_TUNK = 2
+SOURCE_END_ROUND = 3
+SOURCE_NAMES = ['deck', 'discard pile']
+SOURCE_CODES = {'deck': SOURCE_DECK, 'discard pile': SOURCE_DISCARD_PILE, 'tunk': SOURCE_TUNK, 'empty deck': SOURCE_END_ROUND}
+
+
+
+def max_discards(rules):
+  '''
+  Most cards a player can discard in one turn: all of one rank, 4 per deck, or the whole hand.
+  '''
+  return min(rules.hand_size, 4*rules.num_decks)
+
+
+def event_dtype(rules):
+  '''
+  Record type of the events of games played with the given rules.
+  '''
+  return numpy.dtype([
+    ('kind', numpy.uint8),
+    ('game', numpy.uint32),
+    ('round', numpy.uint16),
+    ('player', numpy.uint8),
+    ('spot', numpy.uint8),
+    ('go_around', numpy.uint16),
+    ('deck_left', numpy.uint8),
+    ('source', numpy.uint8),
+    ('drawn', rules.card_dtype),                                # -1 when nothing was drawn
+    ('discards', rules.card_dtype, (max_discards(rules),)),     # -1 pads unused slots
+    ('average', numpy.float64),                                 # Average hand value of a GO_AROUND record
+  ])
+
+
+MAX_DISCARDS = max_discards(Tunk_Rules.STANDARD_RULES)   # A player can discard at most 4 cards of one rank
+EVENT_DTYPE = event_dtype(Tunk_Rules.STANDARD_RULES)
+
+
+class EventSink:
+  '''
+  Receives the events of a game. Subclasses override the events they care about.
+  '''
+  def round_start(self, game):
+    pass
+
+  def turn(self, game, player, deck_left, discards, drawn, drawn_from):
+    '''
+    drawn_from is 'deck' or 'discard pile', or 'tunk'/'empty deck' when the
+      turn ended the round (nothing is discarded or drawn, drawn is -1).
+    '''
+    pass
+
+  def go_around(self, game, average):
+    pass
+
+  def game_over(self, game):
+    pass
+
+
+class BinaryEventSink(EventSink):
+  '''
+  Records events into a preallocated array of EVENT_DTYPE records, or of the records of
+  rules if given.
+  Full buffers are written to fh (an open binary file) if given, or kept in memory otherwise.
+  '''
+  def __init__(self, fh=None, capacity=65536, rules=None):
+    self.fh = fh
+    dtype = event_dtype(rules) if rules is not None else EVENT_DTYPE
+    self.buffer = numpy.zeros(capacity, dtype=dtype)
+    self.max_discards = dtype['discards'].shape[0]
+    self.count = 0
+    self.chunks = []
+
+  def record(self, kind, game, player=0, spot=0, deck_left=0, source=0, drawn=-1, discards=(), average=0.):
+    if self.count == len(self.buffer):
+      self.flush()
+    discards = tuple(discards)
+    self.buffer[self.count] = (kind, game.game_id, game.round_count, player, spot, game.go_around, deck_left,
+                               source, drawn, discards + (-1,)*(self.max_discards - len(discards)), average)
+    self.count += 1
+
+  def round_start(self, game):
+    self.record(ROUND_START, game)
+
+  def turn(self, game, player, deck_left, discards, drawn, drawn_from):
+    self.record(TURN, game, player.number, game.spot_on_table, deck_left, SOURCE_CODES[drawn_from], drawn, discards)
+
+  def go_around(self, game, average):
+    self.record(GO_AROUND, game, average=average)
+
+  def game_over(self, game):
+    self.record(GAME_OVER, game)
+
+  def flush(self):
+    '''
+    Writes out the buffered records in one go.
+    '''
+    if self.fh is not None:
+      self.fh.write(self.buffer[:self.count].tobytes())
+    else:
+      self.chunks.append(self.buffer[:self.count].copy())
+    self.count = 0
+
+  def records(self):
+    '''
+    All records kept in memory, including the ones still in the buffer.
+    '''
+    return numpy.concatenate(self.chunks + [self.buffer[:self.count]])
+
+
+def read_events(path, rules=None):
+  '''
+  Reads a file written by BinaryEventSink, memory mapped so large logs are not loaded at once.
+  '''
+  dtype = event_dtype(rules) if rules is not None else EVENT_DTYPE
+  return numpy.memmap(path, dtype=dtype, mode='r')
+
+
+def render_transcript(records, fh, rules=None):
+  '''
+  Writes the human readable transcript of the given records to fh.
+  '''
+  card_strings = (rules if rules is not None else Tunk_Rules.STANDARD_RULES).card_strings
+  for record in records:
+    kind = record['kind']
+    if kind == TURN:
+      name = 'player_' + str(record['player']+1)
+      fh.write('Cards left in the deck: ' + str(record['deck_left']) + '\n')
+      fh.write('spot ' + str(record['spot']) + '\n')
+      fh.write(name + '\n')
+      source = record['source']
+      if source == SOURCE_DECK or source == SOURCE_DISCARD_PILE:
+        fh.write(name + '\'s turn:\n')
+        for card in record['discards']:
+          if card >= 0:
+            fh.write(name + ' is discarding ' + card_strings[card] + '\n')
+        fh.write(name + ' drew ' + card_strings[record['drawn']] + ' from the ' + SOURCE_NAMES[source] + '\n')
+        fh.write('\n')
+    elif kind == GO_AROUND:
+      fh.write('hello, the go around ' + str(record['go_around']) + ' average was: ' + str(float(record['average'])) + '\n')
+    elif kind == ROUND_START:
+      fh.write('Round ' + str(record['round']) + '\n')
+    elif kind == GAME_OVER:
+      fh.write('Game is over.\n')
+
+
+if __name__ == '__main__':
+  # python Tunk_Events.py <event log> writes the transcript of a binary event log to stdout
+  render_transcript(read_events(sys.argv[1]), sys.stdout)
@@ -0,0 +1,209 @@
+'''
+Self-play optimizer of the tuned strategy (Tunk_Strategies.TunedStrategy).
+
+A policy is a vector of the tuned strategy's parameters: beta in each seat, pair_value,
+and the tunk call value at the start of a round and when the deck runs out. The
+cross-entropy method keeps a normal distribution over policies. Every generation it
+samples a population of policies, plays each of them in every seat against the mean
+policy in the other seats, and moves the distribution toward the best (elite) policies.
+
+Every policy of a generation plays the same game seeds (common random numbers), so they
+are compared on the same deals. All the policies playing one seat are one BatchGame: the
+seat's TunedStrategy gets one parameter value per game, so a generation is a handful of
+batch runs spread over worker processes instead of one Game at a time. The mean policy
+is played too, as policy 0, which gives the baseline the others are measured against.
+'''
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+import Tunk_Batch
+import Tunk_Rules
+import Tunk_Seeding
+import Tunk_Simulator
+import Tunk_Strategies
+
+
+POLICY_PARAMETERS = ('pair_value', 'tunk_call_value', 'tunk_call_late')   # After one beta per seat
+BETA_BOUNDS = (0., 11.)
+# Parameter -> (lowest, highest) value
+BOUNDS = {'pair_value': (1., 11.), 'tunk_call_value': (0., 20.), 'tunk_call_late': (0., 20.)}
+START_STD = 2.
+MIN_STD = 0.1   # Keeps the search from collapsing onto one policy
+GENERATIONS = 20
+POPULATION = 16
+NUM_GAMES = 1000      # Games per policy and seat in each generation
+ELITE_SHARE = 0.25
+SMOOTHING = 0.7       # Weight of the elite in the next distribution
+BATCH_GAMES = 20000   # Games per BatchGame
+GAME_STREAM = 0       # Seed streams of the generations' games, the sampling and the final check
+SAMPLING_STREAM = 1
+CHECK_STREAM = 2
+
+
+def parameter_names(rules):
+  return ['beta_' + str(seat+1) for seat in range(rules.num_players)] + list(POLICY_PARAMETERS)
+
+
+def start_policy(rules):
+  '''
+  The policy that plays exactly like expert in every seat.
+  '''
+  betas = [Tunk_Simulator.PLAYER_1_BETA] + [Tunk_Simulator.BETA]*(rules.num_players - 1)
+  return numpy.array(betas + [Tunk_Strategies.PAIR_VALUE] + [Tunk_Simulator.TUNK_CALL_VALUE]*2, dtype=float)
+
+
+def policy_bounds(rules):
+  '''
+  (lowest, highest) arrays of every parameter of a policy.
+  '''
+  bounds = [BETA_BOUNDS]*rules.num_players + [BOUNDS[name] for name in POLICY_PARAMETERS]
+  return (numpy.array([low for low, high in bounds]), numpy.array([high for low, high in bounds]))
+
+
+def policy_params(policies, seat, rules):
+  '''
+  Keyword parameters of the TunedStrategy playing a policy in seat. With a (games, parameters)
+  array of policies every parameter is an array with one value per game.
+  '''
+  params = {'beta': policies[..., seat]}
+  for index, name in enumerate(POLICY_PARAMETERS):
+    params[name] = policies[..., rules.num_players + index]
+  return params
+
+
+def play_policies(policies, incumbent, seat, seeds, rules):
+  '''
+  Plays each policy in seat against the incumbent policy in the other seats, on all the seeds.
+  Returns the win ratio of each policy.
+  '''
+  num_games = len(seeds)
+  per_game = numpy.repeat(policies, num_games, axis=0)
+  strategies = [Tunk_Strategies.TunedStrategy(**policy_params(incumbent, other, rules)) for other in range(rules.num_players)]
+  strategies[seat] = Tunk_Strategies.TunedStrategy(**policy_params(per_game, seat, rules))
+  result = Tunk_Batch.BatchGame(strategies, len(per_game), seeds=numpy.tile(seeds, len(policies)), rules=rules).play()
+  return (~result.losers[:, seat]).reshape(len(policies), num_games).mean(1)
+
+
+def evaluate(policies, incumbent, seeds, rules=None, executor=None, batch_games=BATCH_GAMES):
+  '''
+  Fitness of each policy (a row of policies): its win ratio against the incumbent averaged
+  over the seats. Runs in executor (a concurrent.futures executor) if given.
+  '''
+  rules = rules if rules is not None else Tunk_Rules.STANDARD_RULES
+  policies = numpy.atleast_2d(policies)
+  block = max(1, batch_games//len(seeds))   # Policies per BatchGame
+  jobs = [(seat, start) for seat in range(rules.num_players) for start in range(0, len(policies), block)]
+  wins = numpy.zeros((rules.num_players, len(policies)))
+  if executor is None:
+    for (seat, start) in jobs:
+      wins[seat, start:start+block] = play_policies(policies[start:start+block], incumbent, seat, seeds, rules)
+  else:
+    futures = dict((executor.submit(play_policies, policies[start:start+block], incumbent, seat, seeds, rules), (seat, start))
+                   for (seat, start) in jobs)
+    for future, (seat, start) in futures.items():
+      wins[seat, start:start+block] = future.result()
+  return wins.mean(0)
+
+
+class OptimizerResult:
+  '''
+  history has one dict per generation: the mean and std it was sampled from, baseline (the
+  fitness of the mean), the best policy and its best_fitness (biased up, it is the best of
+  the population on the same games) and elite_fitness, the average fitness of the elite.
+  mean and std are the final distribution, mean is the tuned policy.
+  '''
+  def __init__(self, rules, seed):
+    self.rules = rules
+    self.seed = seed
+    self.history = []
+    self.mean = None
+    self.std = None
+
+  def policy(self, policy=None):
+    '''
+    The parameters of a policy (the tuned one by default) by name.
+    '''
+    policy = policy if policy is not None else self.mean
+    return dict(zip(parameter_names(self.rules), (float(value) for value in policy)))
+
+  def strategies(self):
+    '''
+    One TunedStrategy per seat playing the tuned policy.
+    '''
+    return [Tunk_Strategies.TunedStrategy(**policy_params(self.mean, seat, self.rules)) for seat in range(self.rules.num_players)]
+
+  def write(self, fh):
+    '''
+    Writes a table of every generation's fitness and mean policy.
+    '''
+    names = parameter_names(self.rules)
+    fh.write('\t'.join(['generation', 'baseline', 'best_fitness', 'elite_fitness'] + names) + '\n')
+    for row in self.history:
+      fields = [str(row['generation'])] + ['%.4f' % row[name] for name in ('baseline', 'best_fitness', 'elite_fitness')]
+      fh.write('\t'.join(fields + ['%.2f' % value for value in row['mean']]) + '\n')
+
+
+def optimize(generations=GENERATIONS, population=POPULATION, num_games=NUM_GAMES, seed=None, workers=None, rules=None,
+             mean=None, std=None, elite_share=ELITE_SHARE, smoothing=SMOOTHING, log=None):
+  '''
+  Searches for the best policy with the cross-entropy method, starting from mean (expert's
+  policy by default) with std (START_STD for every parameter by default), and returns an
+  OptimizerResult. Each generation plays (population + 1)*num_games games per seat across
+  workers processes. log is called with each generation's history entry.
+  '''
+  rules = rules if rules is not None else Tunk_Rules.STANDARD_RULES
+  if seed is None:
+    seed = numpy.random.SeedSequence().entropy
+  if workers is None:
+    workers = os.cpu_count() or 1
+  (low, high) = policy_bounds(rules)
+  mean = numpy.clip(numpy.array(mean if mean is not None else start_policy(rules), dtype=float), low, high)
+  std = numpy.array(std if std is not None else numpy.full(len(mean), START_STD), dtype=float)
+  rng = numpy.random.default_rng(numpy.random.SeedSequence(seed, spawn_key=(SAMPLING_STREAM,)))
+  num_elite = max(2, int(round(population*elite_share)))
+  result = OptimizerResult(rules, seed)
+  executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+  try:
+    for generation in range(generations):
+      seeds = Tunk_Seeding.game_seeds(seed, numpy.arange(num_games), stream=(GAME_STREAM, generation))
+      samples = numpy.clip(mean + std*rng.standard_normal((population, len(mean))), low, high)
+      fitness = evaluate(numpy.vstack([mean, samples]), mean, seeds, rules, executor)
+      (baseline, fitness) = (fitness[0], fitness[1:])
+      order = numpy.argsort(-fitness, kind='stable')
+      elite = samples[order[:num_elite]]
+      result.history.append(dict(generation=generation, mean=mean, std=std, baseline=baseline, best=samples[order[0]],
+                                 best_fitness=fitness[order[0]], elite_fitness=fitness[order[:num_elite]].mean()))
+      if log is not None:
+        log(result.history[-1])
+      mean = smoothing*elite.mean(0) + (1 - smoothing)*mean
+      std = numpy.maximum(smoothing*elite.std(0) + (1 - smoothing)*std, MIN_STD)
+  finally:
+    if executor is not None:
+      executor.shutdown()
+  result.mean = mean
+  result.std = std
+  return result
+
+
+if __name__ == '__main__':
+  # python Tunk_Optimizer.py [generations] [population] [games per policy and seat] [workers]
+  args = [int(arg) for arg in sys.argv[1:]]
+  (generations, population, num_games, workers) = args + [GENERATIONS, POPULATION, NUM_GAMES, None][len(args):]
+
+  def log(row):
+    print('generation ' + str(row['generation']) + ': baseline %.4f, elite %.4f, best %.4f' %
+          (row['baseline'], row['elite_fitness'], row['best_fitness']))
+
+  result = optimize(generations, population, num_games, workers=workers, log=log)
+  for name, value in result.policy().items():
+    print(name + ' = %.2f' % value)
+  # The tuned policy and expert, each in every seat against experts, on the same fresh games
+  expert = start_policy(result.rules)
+  seeds = Tunk_Seeding.game_seeds(result.seed, numpy.arange(10*num_games), stream=(CHECK_STREAM,))
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    (expert_fitness, tuned_fitness) = evaluate(numpy.vstack([expert, result.mean]), expert, seeds, result.rules, executor)
+  print('win ratio against experts: expert %.4f, tuned %.4f' % (expert_fitness, tuned_fitness))
@@ -0,0 +1,269 @@
+'''
+Expected value oracle for tunk calls.
+
+The state a player sees at the start of their turn is summarized as
+  (own hand value, cards left in the deck, low cards discarded this round)
+where low cards are the jokers, aces and twos (Tunk_Simulator.LOW_CARD_MASK).
+For every such state the oracle estimates, with Monte Carlo rollouts:
+  - the chance that the player has the lowest hand
+  - the expected score delta of calling tunk now
+  - the expected score delta of playing on with the normal rules instead
+where the score delta of a round is the player's points minus the average points of
+the other players (lower is better).
+
+States are collected from real batch games, so the other players' hands in a state
+come from the same distribution a player faces when they are in it. Each state is
+replayed many times with the rest of the deck reshuffled, once calling tunk and once
+taking a normal turn and playing the round out.
+
+The table is built in blocks that are independent of each other. Blocks run in parallel
+and the table is saved after every block, so an interrupted build picks up where it stopped.
+The 'optimal' strategy looks its decision up in the finished table.
+The table is built with the standard rules (Tunk_Rules.STANDARD_RULES), games with other
+rules look their states up in it with the cards left in the deck clipped to its range.
+'''
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy
+
+import Tunk_Batch
+import Tunk_Checkpoint
+import Tunk_Simulator
+
+
+ORACLE_PATH = 'tunk_oracle.npz'
+MAX_HAND_VALUE = 12        # Hands worth more than this never call tunk
+DECK_BUCKET = 3            # Cards left in the deck are grouped in threes
+NUM_DECK_BUCKETS = (Tunk_Batch.DECK_SIZE - Tunk_Batch.NUM_PLAYERS*Tunk_Batch.HAND_SIZE - 1 + DECK_BUCKET - 1)//DECK_BUCKET
+MAX_LOW_DISCARDS = bin(Tunk_Simulator.LOW_CARD_MASK).count('1')
+TABLE_SHAPE = (MAX_HAND_VALUE + 1, NUM_DECK_BUCKETS, MAX_LOW_DISCARDS + 1)
+MIN_SAMPLES = 200          # States with fewer rollouts than this fall back to the fixed tunk call value
+SUMS = ('counts', 'lowest', 'call_delta', 'continue_delta', 'difference_squares')
+
+
+def table_index(hand_values, deck_left, low_discards):
+  '''
+  Flat index into the table of each state, works on ints or numpy arrays.
+  '''
+  deck_bucket = numpy.clip((numpy.asarray(deck_left) - 1)//DECK_BUCKET, 0, NUM_DECK_BUCKETS - 1)
+  low_discards = numpy.minimum(low_discards, MAX_LOW_DISCARDS)
+  return numpy.ravel_multi_index((hand_values, deck_bucket, low_discards), TABLE_SHAPE)
+
+
+class OracleTable:
+  '''
+  Running sums of the rollouts of every state, plus the blocks they came from.
+  '''
+  def __init__(self, seed=None):
+    self.seed = seed
+    for name in SUMS:
+      setattr(self, name, numpy.zeros(TABLE_SHAPE))
+    self.blocks_done = set()
+    self.refresh()
+
+  def merge(self, other):
+    for name in SUMS:
+      getattr(self, name)[...] += getattr(other, name)
+    self.blocks_done |= other.blocks_done
+    self.refresh()
+
+  def refresh(self):
+    '''
+    Recomputes the call decision of every state after the sums change.
+    '''
+    counts = numpy.maximum(self.counts, 1)
+    fallback = (numpy.arange(MAX_HAND_VALUE + 1) <= Tunk_Simulator.TUNK_CALL_VALUE)[:, None, None]
+    known = self.counts >= MIN_SAMPLES
+    self.calls = numpy.where(known, self.call_delta/counts < self.continue_delta/counts, fallback).ravel()
+
+  def p_lowest(self):
+    return self.lowest/numpy.maximum(self.counts, 1)
+
+  def expected_call(self):
+    return self.call_delta/numpy.maximum(self.counts, 1)
+
+  def expected_continue(self):
+    return self.continue_delta/numpy.maximum(self.counts, 1)
+
+  def should_call(self, hand_value, deck_left, low_discards):
+    '''
+    Tunk call decision of one player, a single table lookup.
+    '''
+    if hand_value > MAX_HAND_VALUE:
+      return False
+    return bool(self.calls[table_index(hand_value, deck_left, low_discards)])
+
+  def should_call_batch(self, hand_values, deck_left, low_discards):
+    '''
+    Tunk call decisions of arrays of players.
+    '''
+    calls = numpy.zeros(len(hand_values), dtype=bool)
+    known = hand_values <= MAX_HAND_VALUE
+    calls[known] = self.calls[table_index(hand_values[known], deck_left[known], low_discards[known])]
+    return calls
+
+  def save(self, path):
+    '''
+    Writes the table to path, replacing the old file in one step so it is never left half written.
+    '''
+    def write(fh):
+      numpy.savez(fh, blocks_done=numpy.array(sorted(self.blocks_done), dtype=numpy.int64),
+                  seed=numpy.array(str(self.seed)), **dict((name, getattr(self, name)) for name in SUMS))
+    Tunk_Checkpoint.replace_file(path, write, binary=True)
+
+  @staticmethod
+  def load(path):
+    data = numpy.load(path)
+    seed = str(data['seed'])
+    table = OracleTable(None if seed == 'None' else int(seed))
+    for name in SUMS:
+      getattr(table, name)[...] = data[name]
+    table.blocks_done = set(int(block) for block in data['blocks_done'])
+    table.refresh()
+    return table
+
+
+class SnapshotGame(Tunk_Batch.BatchGame):
+  '''
+  BatchGame that saves the state of every turn where the current player could call tunk.
+  '''
+  def __init__(self, *args, **kwargs):
+    Tunk_Batch.BatchGame.__init__(self, *args, **kwargs)
+    self.snapshots = []
+
+  def step(self):
+    games = numpy.flatnonzero(self.active)
+    players = self.whose_turn[games]
+    hand_values = self.value_lookup[self.hands[games, players]].sum(1)
+    decision = ((hand_values <= MAX_HAND_VALUE) & (self.deck_pos[games] < self.deck_size) &
+                (self.go_around[games] < Tunk_Batch.MAX_GO_AROUNDS - 1))
+    games = games[decision]
+    self.snapshots.append((self.hands[games], self.deck[games], self.deck_pos[games], self.top[games],
+                           self.low_discarded[games], players[decision]))
+    Tunk_Batch.BatchGame.step(self)
+
+
+def shuffle_deck(deck, deck_pos, rng):
+  '''
+  Reshuffles the cards left in each deck (from deck_pos on), nobody has seen their order.
+  '''
+  positions = numpy.arange(deck.shape[1])
+  left = positions[None, :] >= deck_pos[:, None]
+  order = numpy.argsort(numpy.where(left, rng.random(deck.shape), -1.), axis=1)
+  return numpy.take_along_axis(deck, order, axis=1)
+
+
+def rollout(snapshots, rollouts, rng, strategies, **kwargs):
+  '''
+  Plays rollouts copies of every snapshot with the rest of the deck reshuffled and returns
+  an OracleTable with the sums of the outcomes.
+  '''
+  (hands, deck, deck_pos, top, low_discarded, players) = (numpy.repeat(column, rollouts, axis=0) for column in snapshots)
+  count = len(players)
+  rows = numpy.arange(count)
+  deck = shuffle_deck(deck, deck_pos, rng)
+  hand_values = Tunk_Batch.VALUE_LOOKUP[hands].sum(2)
+  own_values = hand_values[rows, players]
+  others = numpy.arange(Tunk_Batch.NUM_PLAYERS)[None, :] != players[:, None]
+  other_values = numpy.where(others, hand_values, numpy.iinfo(hand_values.dtype).max)
+  num_others = Tunk_Batch.NUM_PLAYERS - 1
+
+  # Calling now: the others add their hands if this player is the lowest, otherwise this player adds 30
+  lowest = own_values <= other_values.min(1)
+  call_delta = numpy.where(lowest, -(hand_values*others).sum(1)*1./num_others, 30.)
+
+  # Playing on: take a normal turn now and play the round out
+  game = Tunk_Batch.BatchGame(strategies, count, rng, **kwargs)
+  game.single_round = True
+  game.hands[:] = hands
+  game.deck[:] = deck
+  game.deck_pos[:] = deck_pos
+  game.top[:] = top
+  game.low_discarded[:] = low_discarded
+  game.round_count[:] = 1
+  game.take_turns(rows, players)
+  game.whose_turn[:] = (players + 1) % Tunk_Batch.NUM_PLAYERS
+  game.spot_on_table[:] = 2
+  while game.active.any():
+    game.step()
+  continue_delta = game.scores[rows, players] - (game.scores*others).sum(1)*1./num_others
+
+  index = table_index(own_values, Tunk_Batch.DECK_SIZE - deck_pos, low_discarded)
+  size = numpy.prod(TABLE_SHAPE)
+  table = OracleTable()
+  table.counts[...] = numpy.bincount(index, minlength=size).reshape(TABLE_SHAPE)
+  table.lowest[...] = numpy.bincount(index, weights=lowest, minlength=size).reshape(TABLE_SHAPE)
+  table.call_delta[...] = numpy.bincount(index, weights=call_delta, minlength=size).reshape(TABLE_SHAPE)
+  table.continue_delta[...] = numpy.bincount(index, weights=continue_delta, minlength=size).reshape(TABLE_SHAPE)
+  table.difference_squares[...] = numpy.bincount(index, weights=(call_delta - continue_delta)**2, minlength=size).reshape(TABLE_SHAPE)
+  table.refresh()
+  return table
+
+
+def build_block(block, seed, strategies=('expert','expert','expert','expert'), games=200, rollouts=4, max_snapshots=20000, **kwargs):
+  '''
+  Builds the part of the table that comes from one block: plays games to collect states,
+  keeps at most max_snapshots of them and rolls each one out rollouts times.
+  Extra keyword arguments (beta, threshhold...) are passed to Tunk_Batch.BatchGame.
+  '''
+  rng = numpy.random.default_rng(numpy.random.SeedSequence(seed, spawn_key=(block,)))
+  strategies = list(strategies)
+  game = SnapshotGame(strategies, games, rng, **kwargs)
+  game.play()
+  snapshots = [numpy.concatenate(column) for column in zip(*game.snapshots)]
+  if len(snapshots[0]) > max_snapshots:
+    keep = numpy.sort(rng.choice(len(snapshots[0]), max_snapshots, replace=False))
+    snapshots = [column[keep] for column in snapshots]
+  table = rollout(snapshots, rollouts, rng, strategies, **kwargs)
+  table.blocks_done = set([block])
+  return table
+
+
+def build_table(path=ORACLE_PATH, num_blocks=64, seed=0, workers=None, **kwargs):
+  '''
+  Builds blocks 0..num_blocks-1 of the table at path, across workers processes.
+  Blocks already in the saved table are skipped, so calling this again after an
+  interruption (or with a larger num_blocks) only runs the missing blocks.
+  Extra keyword arguments are passed to build_block.
+  '''
+  if os.path.exists(path):
+    table = OracleTable.load(path)
+    if table.seed != seed:
+      raise ValueError('The table at ' + path + ' was built with seed ' + str(table.seed))
+  else:
+    table = OracleTable(seed)
+  if workers is None:
+    workers = os.cpu_count() or 1
+  blocks = [block for block in range(num_blocks) if block not in table.blocks_done]
+
+  if workers == 1:
+    for block in blocks:
+      table.merge(build_block(block, seed, **kwargs))
+      table.save(path)
+    return table
+
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    futures = [executor.submit(build_block, block, seed, **kwargs) for block in blocks]
+    for future in as_completed(futures):
+      table.merge(future.result())
+      table.save(path)
+  return table
+
+
+def load_oracle(path=ORACLE_PATH):
+  return OracleTable.load(path)
+
+
+if __name__ == '__main__':
+  # python Tunk_Oracle.py [table path] [number of blocks] builds or resumes the table
+  path = sys.argv[1] if len(sys.argv) > 1 else ORACLE_PATH
+  num_blocks = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+  table = build_table(path, num_blocks)
+  counts = table.counts.sum((1, 2))
+  calls = table.calls.reshape(TABLE_SHAPE)
+  for value in range(MAX_HAND_VALUE + 1):
+    print('hand value ' + str(value) + ': ' + str(int(counts[value])) + ' rollouts, calls in ' +
+          str(int(calls[value].sum())) + ' of ' + str(calls[value].size) + ' states')
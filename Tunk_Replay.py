@@ -0,0 +1,87 @@
+'''
+Replays single Tunk games with full logging.
+
+Every game is decided by its strategies, parameters and 64 bit seed (see Tunk_Seeding),
+so big runs can play with logging off and any one of their games can be played again in
+Tunk_Simulator with its turn by turn event log. Games in a Tunk_Results directory are
+looked up by game id and the replay is checked against the scores stored for the game.
+
+  python Tunk_Replay.py <results directory> <game id>
+  python Tunk_Replay.py --seed <seed> <strategy,strategy,strategy,strategy>
+write the transcript of the game to stdout.
+'''
+
+import sys
+
+import numpy
+
+import Tunk_Events
+import Tunk_Results
+import Tunk_Simulator
+import Tunk_Tournament
+
+
+def replay_game(strategies, seed, game_id=0, **kwargs):
+  '''
+  Plays the game with the given seed again and returns (game, event records).
+  Extra keyword arguments (beta, threshhold, rules, oracle...) are passed to Tunk_Simulator.Game
+  and must be the same as in the original run.
+  '''
+  events = Tunk_Events.BinaryEventSink(rules=kwargs.get('rules'))
+  game = Tunk_Simulator.Game(strategies, events=events, game_id=game_id, seed=int(seed), **kwargs)
+  game.play_game()
+  return (game, events.records())
+
+
+def find_game(results_dir, game_id):
+  '''
+  Looks a game up in a results directory.
+  Returns (strategies, seed, params, scores), params are the game parameters of its run.
+  '''
+  reader = Tunk_Results.ResultsReader(results_dir)
+  if 'seed' not in reader.columns('games'):
+    raise ValueError('The games in ' + results_dir + ' were stored without their seeds')
+  for chunk in reader.iter_chunks('games', ['game', 'matchup', 'seed', 'scores']):
+    found = numpy.flatnonzero(chunk['game'] == game_id)
+    if len(found):
+      row = found[0]
+      strategies = reader.meta['matchups'][int(chunk['matchup'][row])].split(',')
+      params = {}
+      for run in reader.meta.get('runs', []):
+        if run['first_game'] <= game_id < run['first_game'] + run['num_games']:
+          params = Tunk_Tournament.params_kwargs(run.get('params', {}))
+      return (strategies, int(chunk['seed'][row]), params, [int(score) for score in chunk['scores'][row]])
+  raise ValueError('Game ' + str(game_id) + ' is not in ' + results_dir)
+
+
+def replay_result(results_dir, game_id, **kwargs):
+  '''
+  Replays a game of a results directory with the parameters of its run and returns
+  (game, event records). Raises ValueError if the replay doesn't end with the stored scores.
+  Extra keyword arguments are passed to Tunk_Simulator.Game, e.g. the oracle of 'optimal' games.
+  '''
+  (strategies, seed, params, scores) = find_game(results_dir, game_id)
+  (game, records) = replay_game(strategies, seed, game_id, **dict(params, **kwargs))
+  replayed = [player.score for player in game.players]
+  if replayed != scores:
+    raise ValueError('Replay of game ' + str(game_id) + ' ended with scores ' + str(replayed) + ' instead of ' + str(scores))
+  return (game, records)
+
+
+def oracle_for(strategies):
+  if 'optimal' not in strategies:
+    return {}
+  import Tunk_Oracle
+  return {'oracle': Tunk_Oracle.load_oracle()}
+
+
+if __name__ == '__main__':
+  if sys.argv[1] == '--seed':
+    strategies = sys.argv[3].split(',')
+    (game, records) = replay_game(strategies, int(sys.argv[2]), **oracle_for(strategies))
+  else:
+    (strategies, seed, params, scores) = find_game(sys.argv[1], int(sys.argv[2]))
+    (game, records) = replay_result(sys.argv[1], int(sys.argv[2]), **oracle_for(strategies))
+  Tunk_Events.render_transcript(records, sys.stdout, game.rules)
+  for player in game.players:
+    sys.stdout.write(player.name + ' score: ' + str(player.score) + '\n')
@@ -0,0 +1,151 @@
+'''
+Append-only columnar storage for simulation results.
+
+Results are written as tables of rows (one row per game, one row per go around...).
+Rows are buffered and written in chunks, each chunk is a directory holding one .npy
+file per column:
+  <directory>/<table>/chunk_000000/<column>.npy
+so reading a column memory maps it instead of parsing text, and new runs can keep
+appending chunks to the same directory. Column files may be 2D, e.g. one score per seat.
+'''
+
+import json
+import os
+import shutil
+
+import numpy
+
+import Tunk_Checkpoint
+
+
+META_FILE = 'meta.json'
+
+
+class ResultsWriter:
+
+  def __init__(self, directory, chunk_size=1000000):
+    '''
+    Opens directory for appending, chunks already in it are kept.
+    chunk_size is the number of rows buffered per table before a chunk is written.
+    '''
+    self.directory = directory
+    self.chunk_size = chunk_size
+    self.buffers = {}       # table -> list of dicts of column arrays
+    self.buffered_rows = {}
+    os.makedirs(directory, exist_ok=True)
+
+  def append(self, table, **columns):
+    '''
+    Appends rows to a table, every column is an array with one entry per row.
+    '''
+    lengths = set(len(column) for column in columns.values())
+    if len(lengths) != 1:
+      raise ValueError('All columns must have the same number of rows')
+    self.buffers.setdefault(table, []).append(columns)
+    self.buffered_rows[table] = self.buffered_rows.get(table, 0) + lengths.pop()
+    if self.buffered_rows[table] >= self.chunk_size:
+      self.flush(table)
+
+  def flush(self, table=None):
+    '''
+    Writes the buffered rows of table (or of every table) as a new chunk.
+    '''
+    tables = [table] if table is not None else list(self.buffers)
+    for table in tables:
+      parts = self.buffers.pop(table, [])
+      self.buffered_rows.pop(table, None)
+      if not parts:
+        continue
+      table_dir = os.path.join(self.directory, table)
+      os.makedirs(table_dir, exist_ok=True)
+      name = 'chunk_%06d' % len(list_chunks(self.directory, table))
+      # Write into a temporary directory and rename it so readers never see half a chunk
+      temp_dir = os.path.join(table_dir, '.' + name)
+      os.makedirs(temp_dir, exist_ok=True)
+      for column in parts[0]:
+        numpy.save(os.path.join(temp_dir, column + '.npy'), numpy.concatenate([part[column] for part in parts]))
+      os.rename(temp_dir, os.path.join(table_dir, name))
+
+  def write_meta(self, **meta):
+    '''
+    Merges meta (anything json can store, like the matchups of a run) into the directory's meta.json.
+    '''
+    merged = read_meta(self.directory)
+    merged.update(meta)
+    Tunk_Checkpoint.write_json(os.path.join(self.directory, META_FILE), merged, indent=2)
+
+  def close(self):
+    self.flush()
+
+
+def read_meta(directory):
+  path = os.path.join(directory, META_FILE)
+  if not os.path.exists(path):
+    return {}
+  with open(path) as fh:
+    return json.load(fh)
+
+
+def list_chunks(directory, table):
+  '''
+  Chunk directories of a table in the order they were written.
+  '''
+  table_dir = os.path.join(directory, table)
+  if not os.path.isdir(table_dir):
+    return []
+  return [os.path.join(table_dir, name) for name in sorted(os.listdir(table_dir)) if name.startswith('chunk_')]
+
+
+def drop_chunks(directory, table, keep):
+  '''
+  Deletes every chunk of a table after the first keep, and any half written chunk.
+  '''
+  table_dir = os.path.join(directory, table)
+  if not os.path.isdir(table_dir):
+    return
+  for chunk in list_chunks(directory, table)[keep:]:
+    shutil.rmtree(chunk)
+  for name in os.listdir(table_dir):
+    if name.startswith('.chunk_'):
+      shutil.rmtree(os.path.join(table_dir, name))
+
+
+class ResultsReader:
+
+  def __init__(self, directory):
+    self.directory = directory
+    self.meta = read_meta(directory)
+
+  def tables(self):
+    return sorted(name for name in os.listdir(self.directory) if list_chunks(self.directory, name))
+
+  def columns(self, table):
+    chunks = list_chunks(self.directory, table)
+    if not chunks:
+      return []
+    return sorted(name[:-len('.npy')] for name in os.listdir(chunks[0]) if name.endswith('.npy'))
+
+  def iter_chunks(self, table, columns=None):
+    '''
+    Yields one dict of memory mapped column arrays per chunk, so a table can be
+    processed chunk by chunk without loading it.
+    '''
+    if columns is None:
+      columns = self.columns(table)
+    for chunk in list_chunks(self.directory, table):
+      yield dict((column, numpy.load(os.path.join(chunk, column + '.npy'), mmap_mode='r')) for column in columns)
+
+  def column(self, table, column):
+    '''
+    Reads one whole column of a table into memory.
+    '''
+    parts = [chunk[column] for chunk in self.iter_chunks(table, [column])]
+    if not parts:
+      return numpy.zeros(0)
+    return numpy.concatenate(parts)
+
+  def num_rows(self, table):
+    columns = self.columns(table)
+    if not columns:
+      return 0
+    return sum(len(chunk[columns[0]]) for chunk in self.iter_chunks(table, columns[:1]))
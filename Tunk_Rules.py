@@ -0,0 +1,132 @@
+'''
+Table rules of Tunk.
+
+A Rules object holds everything about the game that house rules change: the number of
+players, how many 54 card decks are shuffled together, the hand size, the penalties, the
+score threshhold and how many times a round may shuffle the discard pile (all but its top
+card) back into an empty deck before the round ends like an empty deck (none by default).
+It is validated when it is made and compiled once into the lookup tables the engines use
+(card values, ranks and names for every card id), so a variant costs nothing per turn.
+
+With several decks card ids run deck*54 + card, where card is the id of the card in a
+single deck: suit*13 + name index for the 52 standard cards, then the red and black jokers.
+'''
+
+import numpy
+
+
+SUITS = ['Spades','Hearts','Diamonds','Clubs']
+NAMES = ['Ace','2','3','4','5','6','7','8','9','10','Jack','Queen','King']
+
+# Cards of a single deck
+DECK_SUITS = [suit for suit in SUITS for name in NAMES] + ['Red', 'Black']
+DECK_NAMES = [name for suit in SUITS for name in NAMES] + ['Joker', 'Joker']
+DECK_VALUES = [1,2,3,4,5,6,7,8,9,10,10,10,10]*4 + [0,0]
+DECK_RANKS = list(range(13))*4 + [13,13]   # Cards of the same rank are multiples of each other
+SINGLE_DECK_SIZE = len(DECK_VALUES)
+NUM_RANKS = 14
+MAX_CARD_VALUE = 10
+LOW_CARD_VALUE = 2  # Jokers, aces and twos are the low cards counted in the discards of a round
+
+THRESHHOLD = 150
+WRONG_TUNK_PENALTY = 30    # Added to the score of a player who calls tunk without the lowest hand
+LOWEST_HAND_PENALTY = 15   # Added to the lowest hand when the deck runs out
+
+# Field -> (lowest, highest) allowed value
+SCHEMA = {
+  'num_players': (2, 8),
+  'num_decks': (1, 4),
+  'hand_size': (1, 15),
+  'wrong_tunk_penalty': (0, 1000),
+  'lowest_hand_penalty': (0, 1000),
+  'threshhold': (1, 100000),
+  'reshuffles': (0, 100),
+}
+
+
+class Rules:
+
+  def __init__(self, num_players=4, num_decks=1, hand_size=5, wrong_tunk_penalty=WRONG_TUNK_PENALTY,
+               lowest_hand_penalty=LOWEST_HAND_PENALTY, threshhold=THRESHHOLD, reshuffles=0):
+    '''
+    Validates the rules and compiles their tables, raises ValueError for rules that can't be played.
+    '''
+    self.num_players = num_players
+    self.num_decks = num_decks
+    self.hand_size = hand_size
+    self.wrong_tunk_penalty = wrong_tunk_penalty
+    self.lowest_hand_penalty = lowest_hand_penalty
+    self.threshhold = threshhold
+    self.reshuffles = reshuffles
+    for name, (low, high) in SCHEMA.items():
+      value = getattr(self, name)
+      if not isinstance(value, (int, numpy.integer)) or isinstance(value, bool):
+        raise ValueError(name + ' must be an int, got ' + repr(value))
+      if not low <= value <= high:
+        raise ValueError(name + ' must be between ' + str(low) + ' and ' + str(high) + ', got ' + str(value))
+
+    self.deck_size = SINGLE_DECK_SIZE*num_decks
+    if self.deck_size < num_players*hand_size + 2:
+      raise ValueError(str(num_decks) + ' deck(s) are too small to deal ' + str(hand_size) + ' cards to ' +
+                       str(num_players) + ' players and still draw')
+
+    # Tables indexed by card id
+    self.card_suits = DECK_SUITS*num_decks
+    self.card_names = DECK_NAMES*num_decks
+    self.card_values = DECK_VALUES*num_decks
+    self.card_ranks = DECK_RANKS*num_decks
+    self.card_strings = ['(' + name + ' of ' + suit + ')' for suit, name in zip(self.card_suits, self.card_names)]
+    self.deck_template = list(range(self.deck_size))
+    self.low_card_mask = sum(1 << card for card in self.deck_template if self.card_values[card] <= LOW_CARD_VALUE)
+    self.card_dtype = numpy.int8 if self.deck_size <= 128 else numpy.int16  # Same as Tunk_Seeding.shuffled_decks
+    # Same tables for numpy with one extra entry so that indexing with -1 (an empty hand slot) gives value 0 / rank -1
+    self.value_lookup = numpy.array(self.card_values + [0], dtype=numpy.int16)
+    self.rank_lookup = numpy.array(self.card_ranks + [-1], dtype=numpy.int16)
+    self.low_lookup = numpy.append(numpy.array(self.card_values) <= LOW_CARD_VALUE, False)
+
+  def as_dict(self):
+    return dict((name, int(getattr(self, name))) for name in SCHEMA)
+
+  @staticmethod
+  def from_dict(fields):
+    '''
+    Rules from a dict like as_dict() gives, unknown fields are an error.
+    '''
+    unknown = [name for name in fields if name not in SCHEMA]
+    if unknown:
+      raise ValueError('Unknown rules: ' + ', '.join(sorted(unknown)))
+    return Rules(**fields)
+
+  def replace(self, **fields):
+    '''
+    Copy of the rules with the given fields changed.
+    '''
+    merged = self.as_dict()
+    merged.update(fields)
+    return Rules.from_dict(merged)
+
+  def __eq__(self, other):
+    return isinstance(other, Rules) and self.as_dict() == other.as_dict()
+
+  def __hash__(self):
+    return hash(tuple(sorted(self.as_dict().items())))
+
+  def __repr__(self):
+    return 'Rules(' + ', '.join(name + '=' + str(value) for name, value in self.as_dict().items()) + ')'
+
+
+STANDARD_RULES = Rules()
+
+
+def rules_for(strategies, rules=None):
+  '''
+  The rules of a game between the given strategies: rules if given, which must have one seat
+  per strategy, otherwise the standard rules with one seat per strategy.
+  '''
+  if rules is None:
+    if len(strategies) == STANDARD_RULES.num_players:
+      return STANDARD_RULES
+    return STANDARD_RULES.replace(num_players=len(strategies))
+  if len(strategies) != rules.num_players:
+    raise ValueError('Expected ' + str(rules.num_players) + ' strategies, got ' + str(len(strategies)))
+  return rules
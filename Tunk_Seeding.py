@@ -0,0 +1,93 @@
+'''
+Seeding of Tunk games.
+
+Every game has a 64 bit seed and the deck of each round is a fixed function of the
+game's seed and the round number, so the same seed deals the same cards in both
+engines, for any strategies or parameters, on any worker. Decks are shuffled by
+Fisher-Yates with the swap at each position hashed from the round's deck key and the
+position, so the cards can be shuffled one at a time as they are drawn.
+Game seeds come from a root seed split with numpy.random.SeedSequence spawn keys: game_seeds(root, ids, stream)
+gives independent games for every stream (e.g. one stream per matchup of a tournament),
+and any single game can be played again from its seed (see Tunk_Replay).
+'''
+
+import numpy
+
+
+MASK_64 = (1 << 64) - 1
+
+
+def splitmix64(x):
+  '''
+  SplitMix64 hash of a uint64 array, used as a counter based random number generator.
+  '''
+  x = x + numpy.uint64(0x9E3779B97F4A7C15)
+  x = (x ^ (x >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+  x = (x ^ (x >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+  return x ^ (x >> numpy.uint64(31))
+
+
+def splitmix64_int(x):
+  '''
+  splitmix64 of one Python int, for the scalar engine.
+  '''
+  x = (x + 0x9E3779B97F4A7C15) & MASK_64
+  x = ((x ^ (x >> 30))*0xBF58476D1CE4E5B9) & MASK_64
+  x = ((x ^ (x >> 27))*0x94D049BB133111EB) & MASK_64
+  return x ^ (x >> 31)
+
+
+def game_seeds(root_seed, game_ids, stream=()):
+  '''
+  Seeds of the given game ids under a root seed and stream (a SeedSequence spawn key).
+  The same root seed, stream and game id always give the same game.
+  '''
+  root = numpy.random.SeedSequence(root_seed, spawn_key=tuple(stream)).generate_state(1, numpy.uint64)[0]
+  return splitmix64(numpy.asarray(game_ids, dtype=numpy.uint64) ^ root)
+
+
+def deck_keys(seeds, rounds, reshuffles=0):
+  '''
+  Keys of the decks of the given game seeds and round numbers. reshuffles counts the
+  discard piles shuffled back into the deck so far in the round (see Tunk_Rules).
+  '''
+  rounds = numpy.asarray(rounds, dtype=numpy.uint64) + (numpy.asarray(reshuffles, dtype=numpy.uint64) << numpy.uint64(32))
+  return splitmix64(numpy.asarray(seeds, dtype=numpy.uint64) ^ splitmix64(rounds))
+
+
+def deck_key(seed, round_number, reshuffles=0):
+  '''
+  deck_keys of one game with Python ints.
+  '''
+  return splitmix64_int(seed ^ splitmix64_int(round_number + (reshuffles << 32)))
+
+
+def swap_targets(keys, positions, deck_size):
+  '''
+  Fisher-Yates step of each deck key at the given positions: the card drawn at a position
+  is swapped in from the returned position, between it and the end of the deck.
+  '''
+  positions = numpy.asarray(positions, dtype=numpy.uint64)
+  hashed = splitmix64(keys + positions)
+  return (positions + (((hashed >> numpy.uint64(32))*(numpy.uint64(deck_size) - positions)) >> numpy.uint64(32))).astype(numpy.int64)
+
+
+def shuffled_decks(keys, deck_size, cards=None):
+  '''
+  Decks (one row of card ids per key, drawn from the front) shuffled with swap_targets,
+  int8 if the card ids fit and int16 otherwise. Only the first cards positions (all of
+  them by default) are shuffled, the rest of each row holds the cards left in no
+  particular order, to be shuffled with swap_targets as they are drawn.
+  '''
+  cards = deck_size - 1 if cards is None else min(cards, deck_size - 1)   # The last card has nothing to swap with
+  decks = numpy.tile(numpy.arange(deck_size, dtype=numpy.int8 if deck_size <= 128 else numpy.int16), len(keys))
+  # Swapping in the flat array is cheaper than indexing rows and columns
+  starts = numpy.arange(len(keys))*deck_size
+  targets = (swap_targets(keys[:, None], numpy.arange(cards)[None, :], deck_size) + starts[:, None]).T.copy()
+  for position in range(cards):
+    target = targets[position]
+    here = starts + position
+    card = decks[target]
+    decks[target] = decks[here]
+    decks[here] = card
+  return decks.reshape(len(keys), deck_size)
@@ -14,107 +14,283 @@ Gameplay is as follows:
 
 import random
 import math
-from collections import Counter
 import numpy
 
+import Tunk_Rules
+import Tunk_Seeding
+import Tunk_Strategies
+import Tunk_Trajectories
 
-DISCARD_PILE = []
-PLAYER_1 = None
-PLAYER_2 = None
-PLAYER_3 = None
-PLAYER_4 = None
-THRESHHOLD = 150
-TURN_ORDER = []
-GAME_OVER = False
-ROUND_OVER = False
+
+THRESHHOLD = Tunk_Rules.THRESHHOLD
 BETA = 6
 PLAYER_1_BETA = 9
-LOSSES = [0,0,0,0]
-WINS = [0,0,0,0]
-CALLING_ARRAY = numpy.zeros((1000, 500))
+TUNK_CALL_VALUE = 7  # Players call tunk when their hand is worth this much or less
+MAX_GO_AROUNDS = 500 # Some rounds never run the deck out (players keep swapping the same discards), these are ended like an empty deck
+DRAW_CHUNK = 64      # Deck swaps hashed at a time, a whole standard deck costs about as much to hash as a few cards
+
+SUITS = Tunk_Rules.SUITS
+NAMES = Tunk_Rules.NAMES
+
+# Cards are ints 0-53: suit*13 + name index for the 52 standard cards, then the red and black jokers.
+# Everything the game needs to know about a card is looked up in these tables, games played
+# with other rules (more decks, see Tunk_Rules) look their cards up in the tables of their rules.
+STANDARD_RULES = Tunk_Rules.STANDARD_RULES
+CARD_SUITS = STANDARD_RULES.card_suits
+CARD_NAMES = STANDARD_RULES.card_names
+CARD_VALUES = STANDARD_RULES.card_values
+CARD_RANKS = STANDARD_RULES.card_ranks
+CARD_STRINGS = STANDARD_RULES.card_strings
+NUM_RANKS = Tunk_Rules.NUM_RANKS
+MAX_CARD_VALUE = Tunk_Rules.MAX_CARD_VALUE
+LOW_CARD_VALUE = Tunk_Rules.LOW_CARD_VALUE  # Jokers, aces and twos are the low cards counted in the discards of a round
+LOW_CARD_MASK = STANDARD_RULES.low_card_mask
 
 class Card:
   '''
-  s = card suit
-  n = card name
-  v = card value in tunk
+  Display view of a card id.
+  suit = card suit
+  name = card name
+  value = card value in tunk
   '''
-  def __init__(self, s, n, v):
-    self.suit = s
-    self.name = n
-    self.value = v
+  def __init__(self, card_id):
+    self.id = card_id
+    self.suit = CARD_SUITS[card_id]
+    self.name = CARD_NAMES[card_id]
+    self.value = CARD_VALUES[card_id]
 
   def __str__(self):
-    return '(' + self.name + ' of ' + self.suit + ')'
+    return CARD_STRINGS[self.id]
 
   def __repr__(self):
-    return '(' + self.name + ' of ' + self.suit + ')'
+    return CARD_STRINGS[self.id]
 
   def __eq__(self, other):
-    if self.name == other.name and self.value == other.value:
-      return True
-    return False
+    return CARD_RANKS[self.id] == CARD_RANKS[other.id]
 
   def __hash__(self):
-    return self.name.__hash__() + self.value.__hash__()
+    return CARD_RANKS[self.id]
 
 
 class Deck:
   '''
-  Deck contains 52 standard cards + 2 jokers
+  Deck contains 52 standard cards + 2 jokers as card ids, once for every deck of the rules.
+  The order of each round's deck is a fixed function of the game seed and the round number
+  (Tunk_Seeding.swap_targets), the same decks the batch engine deals for that seed.
+  Cards are shuffled one at a time as they are drawn (partial Fisher-Yates) in a buffer
+  reused every round, and a new round undoes the swaps of the last one, so a round costs
+  as much as the cards drawn in it. The swaps are hashed DRAW_CHUNK positions at a time.
+  len(deck) is the number of cards left.
   '''
-  def __init__(self):
-    self.suits = self.suits = ['Spades','Hearts','Diamonds','Clubs']
-    self.names = ['Ace','2','3','4','5','6','7','8','9','10','Jack','Queen','King']
-    self.cards = []
-    for suit in self.suits:
-      for name in self.names:
-        if name == 'Ace':
-          value = 1
-        elif name in ['Jack', 'Queen','King']:
-          value = 10
-        else:
-          value = int(name)
-        card = Card(suit, name, value)
-        self.cards.append(card)
-    self.cards.append(Card('Red', 'Joker', 0))
-    self.cards.append(Card('Black', 'Joker', 0))
-    random.shuffle(self.cards)
+  def __init__(self, seed=0, rules=None):
+    self.seed = seed
+    self.size = (rules if rules is not None else STANDARD_RULES).deck_size
+    self.buffer = list(range(self.size))   # The cards drawn in the order they were drawn, then the cards left
+    self.position = self.size   # Next card to draw, empty until the first shuffle
+    self.targets = []   # Position swapped with at every position, as far as hashed
+    self.refilled = False
+    self.key = 0
+
+  def shuffle(self, round_number):
+    buffer = self.buffer
+    if self.refilled:
+      buffer[:] = range(self.size)
+      self.refilled = False
+    else:
+      targets = self.targets
+      for position in range(min(self.position, len(targets)) - 1, -1, -1):   # Undo the swaps of the last round
+        target = targets[position]
+        (buffer[position], buffer[target]) = (buffer[target], buffer[position])
+    self.position = 0
+    self.key = Tunk_Seeding.deck_key(self.seed, round_number)
+    self.targets = []
+
+  def refill(self, cards, key):
+    '''
+    Makes cards the rest of the deck, shuffled as they are drawn with a new deck key.
+    '''
+    self.position = self.size - len(cards)
+    self.buffer[self.position:] = cards
+    self.refilled = True   # The swaps don't put the buffer back any more
+    self.key = key
+    self.targets = [-1]*self.position   # Nothing left to swap before the new cards
+
+  def hash_targets(self):
+    start = len(self.targets)
+    end = min(start + DRAW_CHUNK, self.size)
+    self.targets += Tunk_Seeding.swap_targets(numpy.uint64(self.key), numpy.arange(start, end), self.size).tolist()
 
   def draw(self):
-    return self.cards.pop()
+    position = self.position
+    if position == len(self.targets):
+      self.hash_targets()
+    target = self.targets[position]
+    buffer = self.buffer
+    card = buffer[target]
+    buffer[target] = buffer[position]
+    buffer[position] = card
+    self.position = position + 1
+    return card
+
+  def __len__(self):
+    return self.size - self.position
+
+
+class DiscardPile:
+  '''
+  The discard pile of a round, a ring buffer with room for every card of the deck (no card
+  is in it twice) that is reset at the start of every round.
+  '''
+  def __init__(self, capacity):
+    self.cards = [-1]*capacity
+    self.capacity = capacity
+    self.reset()
+
+  def reset(self):
+    self.top_index = self.capacity - 1   # Index of the top card
+    self.count = 0
+
+  def push(self, card):
+    top_index = self.top_index + 1
+    if top_index == self.capacity:
+      top_index = 0
+    self.cards[top_index] = card
+    self.top_index = top_index
+    self.count += 1
+
+  def top(self):
+    return self.cards[self.top_index]
+
+  def pop(self):
+    card = self.cards[self.top_index]
+    self.top_index = (self.top_index - 1) % self.capacity
+    self.count -= 1
+    return card
+
+  def take_bottom(self):
+    '''
+    Removes every card but the top one and returns them, bottom first.
+    '''
+    bottom = self.top_index - self.count + 1
+    taken = [self.cards[index % self.capacity] for index in range(bottom, self.top_index)]
+    self.count = 1
+    return taken
+
+  def __len__(self):
+    return self.count
+
 
 class Player:
-  def __init__(self, game_strategy, player_name, player_num):
+  '''
+  strategy is the players Tunk_Strategies.Strategy.
+  The hand is a dict of card -> the order it was added in, so it iterates in hand order.
+  add_card/remove_card keep these up to date in O(1), whatever the hand size:
+    hand_value    total value of the hand
+    rank_counts   number of cards of each rank
+    rank_cards    the cards of each rank, in hand order
+    multiples     the ranks with 2 or more cards
+    value_cards   the cards of each value, in hand order
+    highest_value value of the highest card, -1 for an empty hand
+    hand_mask     bit mask of the cards in the hand
+  Cards are looked up in the tables of rules (a Tunk_Rules.Rules), the standard rules by default.
+  '''
+  def __init__(self, game_strategy, player_name, player_num, rules=None):
     self.name = player_name
-    self.hand = []
     self.score = 0
     self.turn = False
     self.strategy = game_strategy
     self.number = player_num
+    rules = rules if rules is not None else STANDARD_RULES
+    self.card_values = rules.card_values
+    self.card_ranks = rules.card_ranks
+    self.clear_hand()
+
+  def add_card(self, card):
+    self.hand[card] = self.added
+    self.added += 1
+    self.hand_mask |= 1 << card
+    value = self.card_values[card]
+    rank = self.card_ranks[card]
+    self.hand_value += value
+    rank_counts = self.rank_counts
+    rank_counts[rank] += 1
+    self.rank_cards[rank][card] = None
+    if rank_counts[rank] == 2:
+      self.multiples[rank] = None
+    self.value_cards[value][card] = None
+    if value > self.highest_value:
+      self.highest_value = value
+
+  def remove_card(self, card):
+    del self.hand[card]
+    self.hand_mask &= ~(1 << card)
+    value = self.card_values[card]
+    rank = self.card_ranks[card]
+    self.hand_value -= value
+    rank_counts = self.rank_counts
+    rank_counts[rank] -= 1
+    del self.rank_cards[rank][card]
+    if rank_counts[rank] == 1:
+      del self.multiples[rank]
+    cards = self.value_cards[value]
+    del cards[card]
+    if value == self.highest_value and not cards:
+      self.highest_value = self.lower_value(value)
+
+  def clear_hand(self):
+    if not hasattr(self, 'hand'):
+      self.hand = {}
+      self.rank_counts = [0]*NUM_RANKS
+      self.rank_cards = [{} for rank in range(NUM_RANKS)]
+      self.multiples = {}
+      self.value_cards = [{} for value in range(MAX_CARD_VALUE + 1)]
+    for card in self.hand:  # Only the entries of the cards in the hand need clearing
+      rank = self.card_ranks[card]
+      self.rank_counts[rank] = 0
+      self.rank_cards[rank].clear()
+      self.value_cards[self.card_values[card]].clear()
+    self.hand.clear()
+    self.multiples.clear()
+    self.added = 0
+    self.hand_mask = 0
+    self.hand_value = 0
+    self.highest_value = -1
+
+  def lower_value(self, value):
+    '''
+    Highest value below the given one that has a card in the hand, -1 if there is none.
+    '''
+    for lower in range(value - 1, -1, -1):
+      if self.value_cards[lower]:
+        return lower
+    return -1
 
   def get_hand_value(self):
     '''
     Get the total point value of the players hand
     '''
-    hand_value = 0
-    for card in self.hand:
-      hand_value += card.value
-    return hand_value
+    return self.hand_value
 
   def get_highest_card(self):
     '''
-    Get highest value card in the players hand
+    Get highest value card in the players hand, the first one in hand order if there is a tie
+    '''
+    for card in self.value_cards[self.highest_value]:
+      return card
+
+  def get_next_highest_card(self):
+    '''
+    Highest value card in the players hand other than get_highest_card()
     '''
-    highest_card = self.hand[0]
-    for card in self.hand:
-      if card.value > highest_card.value:
-        highest_card = card
-    return highest_card
+    cards = iter(self.value_cards[self.highest_value])
+    next(cards)
+    for card in cards:
+      return card
+    for card in self.value_cards[self.lower_value(self.highest_value)]:
+      return card
 
   def __eq__(self, other):
-    if self.name != other.name:
-      return False
+    return self.name == other.name
 
   def __str__(self):
     return self.name
@@ -123,61 +299,132 @@ class Player:
     return self.name.__hash__()
 
 
+class ResultSink:
+  '''
+  Receives the results of finished games.
+  Any number of sinks can be passed to a Game, they are called once when it is over.
+  '''
+  def record_game(self, game, losing_players, winning_players):
+    pass
+
+
+class WinLossSink(ResultSink):
+  '''
+  Counts wins and losses per seat.
+  '''
+  def __init__(self, num_players=4):
+    self.wins = [0]*num_players
+    self.losses = [0]*num_players
+    self.num_games = 0
+
+  def record_game(self, game, losing_players, winning_players):
+    self.num_games += 1
+    for player in losing_players:
+      self.losses[player.number] += 1
+    for player in winning_players:
+      self.wins[player.number] += 1
+
+
+class ScoreCountSink(ResultSink):
+  '''
+  Adds up each games average hand value per go around averaged over its rounds, the row sum of CALLING_ARRAY.
+  '''
+  def __init__(self):
+    self.score_counts = numpy.zeros(MAX_GO_AROUNDS)
+    self.num_games = 0
+
+  def record_game(self, game, losing_players, winning_players):
+    self.num_games += 1
+    weight = 1./(len(game.players)*game.round_count)
+    for (round_count, go_around, hand_values) in game.trajectory:
+      self.score_counts[go_around] += sum(hand_values)*weight
+
+
+class TrajectorySink(ResultSink):
+  '''
+  Streams every games hand values at the end of each go around into a Tunk_Trajectories.TrajectoryStats.
+  '''
+  def __init__(self, strategies, rules=None):
+    self.stats = Tunk_Trajectories.TrajectoryStats(strategies, rules)
+    self.num_games = 0
+
+  def record_game(self, game, losing_players, winning_players):
+    self.num_games += 1
+    if game.trajectory:
+      (rounds, go_arounds, hand_values) = zip(*game.trajectory)
+      self.stats.add(numpy.array(hand_values), numpy.array(rounds), numpy.array(go_arounds))
+
+
 class Game:
 
-  def __init__(self, strategies):
+  def __init__(self, strategies, sinks=(), events=None, game_id=0, beta=None, player_1_beta=None, threshhold=None, tunk_call_value=None, oracle=None, seed=None, rules=None):
     '''Initializes the game by:
       - Creating the deck
       - Creating discard pile
       - Dealing players hands
       - Setting scores
       - Deciding who goes first
+    There is one player per strategy. All of the game state lives on the Game,
+    so any number of games can be played side by side.
+    Results are passed to each of the sinks when the game is over. The turn by turn
+      log is only reported when an events sink (see Tunk_Events) is given.
+    strategies are names registered in Tunk_Strategies or Strategy objects. Named strategies
+      are made with beta (player_1_beta in the first seat), tunk_call_value and oracle
+      (a Tunk_Oracle.OracleTable, needed by 'optimal').
+    seed is the 64 bit seed that decides every deck of the game (see Tunk_Seeding), a random one
+      is drawn if not given. It is kept as game.seed so the game can be replayed.
+    rules is a Tunk_Rules.Rules with the table size, number of decks, hand size, penalties and
+      threshhold, the standard rules with one seat per strategy by default. threshhold overrides
+      the threshhold of the rules.
     '''
-    global PLAYER_1, PLAYER_2, PLAYER_3, PLAYER_4, DISCARD_PILE, TURN_ORDER, LOSSES, WINS
     # fh.write('Initializing game.')
-    self.deck = Deck()
-    PLAYER_1 = Player(strategies[0], 'player_1', 0)
-    PLAYER_2 = Player(strategies[1], 'player_2', 1)
-    PLAYER_3 = Player(strategies[2], 'player_3', 2)
-    PLAYER_4 = Player(strategies[3], 'player_4', 3)
-    TURN_ORDER = [PLAYER_1, PLAYER_2, PLAYER_3, PLAYER_4]
-    self.whose_turn = PLAYER_1
-    DISCARD_PILE = []
+    rules = Tunk_Rules.rules_for(strategies, rules)
+    self.rules = rules
+    self.seed = seed if seed is not None else random.getrandbits(64)
+    self.deck = Deck(self.seed, rules)
+    seats = Tunk_Strategies.seat_strategies(strategies, beta, player_1_beta, tunk_call_value, oracle)
+    self.players = [Player(strategy, 'player_' + str(number+1), number, rules) for number, strategy in enumerate(seats)]
+    self.whose_turn = self.players[0]
+    self.discard_pile = DiscardPile(rules.deck_size)
+    self.reshuffles = 0   # Discard piles shuffled back into the deck this round
+    self.game_over = False
+    self.round_over = False
+    self.sinks = list(sinks)
+    self.events = events
+    self.game_id = game_id
+    self.threshhold = threshhold if threshhold is not None else rules.threshhold
+    self.discarded = 0 # Bit mask of the cards discarded this round
+    self.shown = 0     # Bit mask of the cards turned face up this round and not shuffled back into the deck (see Tunk_Counting)
+    self.trajectory = []   # (round, go around, hand value of each player) at the end of every go around
+    self.round_count = 0
+    self.go_around = 0
+    self.spot_on_table = 1 #keep track of which players turn it is easily
+    self.turn_count = 0    # Turns played in the game, tunk calls and empty decks included
 
   def deal(self):
     '''
-    Deals a 5 card hand to each of the 4 players from the deck.
+    Deals a hand of rules.hand_size cards to each player from the deck.
     '''
-    global PLAYER_1, PLAYER_2, PLAYER_3, PLAYER_4
-    PLAYER_1.hand = []
-    PLAYER_2.hand = []
-    PLAYER_3.hand = []
-    PLAYER_4.hand = []
-    for i in range(5):
-      PLAYER_1.hand.append(self.deck.draw())
-      PLAYER_2.hand.append(self.deck.draw())
-      PLAYER_3.hand.append(self.deck.draw())
-      PLAYER_4.hand.append(self.deck.draw())
+    for player in self.players:
+      player.clear_hand()
+    for i in range(self.rules.hand_size):
+      for player in self.players:
+        player.add_card(self.deck.draw())
 
-  def discard(player_hand, cards):
+  def discard(self, player, cards):
     '''
     Discards the passed in cards from the players hand to the discard pile.
     '''
-    global DISCARD_PILE
     for card in cards:
-      DISCARD_PILE.append(card)
-      player_hand.remove(card)
-    return player_hand
+      self.discard_pile.push(card)
+      player.remove_card(card)
+    return player.hand
 
   def next_player(self, player):
     '''
     Returns the player for the next turn.
     '''
-    index = TURN_ORDER.index(player)
-    if index == 3:
-      return PLAYER_1
-    else:
-      return TURN_ORDER[index+1]
+    return self.players[(player.number+1) % len(self.players)]
 
 
   def is_game_over(self):
@@ -187,25 +434,19 @@ class Game:
       True and the list of losing players
     Else returns false and the game continues.
     '''
-    global ROUND_OVER, GAME_OVER
     losing_players = []
-    if PLAYER_1.score >= THRESHHOLD:  # Player 1 loses
-      losing_players.append(PLAYER_1)
-    if PLAYER_2.score >= THRESHHOLD:  # Player 2 loses
-      losing_players.append(PLAYER_2)
-    if PLAYER_3.score >= THRESHHOLD:  # Player 3 loses
-      losing_players.append(PLAYER_3)
-    if PLAYER_4.score >= THRESHHOLD:  # Player 4 loses
-      losing_players.append(PLAYER_4)
+    for player in self.players:
+      if player.score >= self.threshhold:  # Player loses
+        losing_players.append(player)
     if losing_players:                # If there are losing players then the game is over
       winning_players = []
-      for player in TURN_ORDER:
+      for player in self.players:
         if player not in losing_players:
           winning_players.append(player)
-      GAME_OVER = True
+      self.game_over = True
       return (losing_players, winning_players)
     else:
-      ROUND_OVER = False
+      self.round_over = False
       return (None, None)
 
   def call_tunk(self, player):
@@ -215,35 +456,33 @@ class Game:
       compared to the other players hand values.
     - If the players hand value is the lowest, each other player adds their current hand value
       to their score
-    - If not add 30 points to the current players score.
+    - If not add 30 points (rules.wrong_tunk_penalty) to the current players score.
     '''
-    global PLAYER_1, PLAYER_2, PLAYER_3, PLAYER_4, ROUND_OVER
-
     # fh.write(player.name + ' has called tunk.\n')
 
     player_lowest = True
     player_hand_value = player.get_hand_value() # Get the current players hand value
-    other_min_hand = PLAYER_2
-    other_min_hand_value = PLAYER_2.get_hand_value()
-    for other in TURN_ORDER: # check all other players hand value against the current players hand value
-      if player != other:
+    other_min_hand = None
+    other_min_hand_value = None
+    for other in self.players: # check all other players hand value against the current players hand value
+      if player is not other:
         other_hand_value = other.get_hand_value()
         if player_hand_value > other_hand_value:
           player_lowest = False
-          if other_hand_value < other_min_hand_value:
-            other_min_hand = other
-            other_min_hand_value = other_hand_value
+        if other_min_hand is None or other_hand_value < other_min_hand_value:
+          other_min_hand = other
+          other_min_hand_value = other_hand_value
     if not player_lowest: # Current player loses the round.
       # fh.write(player.name + ' was not the lowest and adds 30 points to their score.\n')
-      player.score += 30 # Add 30 points to their score
+      player.score += self.rules.wrong_tunk_penalty # Add 30 points to their score
       self.whose_turn = other_min_hand
     else: # Current player wins the round. All other players add their hand value to their score
       # fh.write(player.name + ' was the lowest, all other players add their hand value to their score.\n')
-      for other in TURN_ORDER:
-        if player != other:
+      for other in self.players:
+        if player is not other:
           other.score += other.get_hand_value()
       self.whose_turn = player
-    ROUND_OVER = True # This ends the round.
+    self.round_over = True # This ends the round.
     # fh.write('\n')
 
   def end_round(self):
@@ -251,29 +490,43 @@ class Game:
     This method is called when a round ends and the deck is empty.
     If the deck runs out before someone calls tunk, each player adds the
       value of their hand to their score.
-    The player with the lowest hand value adds and additional 15 points to their score.
+    The player with the lowest hand value adds and additional 15 points (rules.lowest_hand_penalty) to their score.
     '''
-    global ROUND_OVER
     # fh.write('Deck is empty, round ends with no player calling tunk.\n')
     # fh.write('All players add their hand value to their score.\n')
-    min_player_hand = PLAYER_1                          # PLAYER_1 is set as the default lowest hand
-    min_player_hand_value = PLAYER_1.get_hand_value()   # PLAYER_1 hand value
-    for other in [PLAYER_2,PLAYER_3,PLAYER_4]:          # Loop through the other players hands and check the values
+    min_player_hand = self.players[0]                          # The first player is set as the default lowest hand
+    min_player_hand_value = self.players[0].get_hand_value()   # First players hand value
+    for other in self.players[1:]:                      # Loop through the other players hands and check the values
       other_hand_value = other.get_hand_value()
       if other_hand_value < min_player_hand_value:      # If a players hand is lower than the current min, set the current players hand as the min
         min_player_hand = other
         min_player_hand_value = other_hand_value
-    for player in TURN_ORDER:                           # Add points to players hands
+    for player in self.players:                         # Add points to players hands
       player_hand_value = player.get_hand_value()
-      if player == min_player_hand:
+      if player is min_player_hand:
         # fh.write(player.name + ' had the lowest hand and adds 15 extra points to their score.\n')
-        player.score += 15                              # Add additional 15 points to player with lowest hand
+        player.score += self.rules.lowest_hand_penalty  # Add additional 15 points to player with lowest hand
       player.score += player_hand_value
     # fh.write('\n')
-    go_around = 0
-    ROUND_OVER = True # End the current round
+    self.round_over = True # End the current round
+
 
 
+  def reshuffle_discards(self):
+    '''
+    Shuffles the discard pile, all but its top card, back into the empty deck (rules.reshuffles).
+    '''
+    self.reshuffles += 1
+    cards = sorted(self.discard_pile.take_bottom())   # In id order, so the deck only depends on which cards they are
+    self.deck.refill(cards, Tunk_Seeding.deck_key(self.seed, self.round_count, self.reshuffles))
+    self.discarded = 1 << self.discard_pile.top()   # The cards back in the deck are no longer out of play
+    self.shown &= ~sum(1 << card for card in cards)
+
+  def low_discards(self):
+    '''
+    Number of low cards (see LOW_CARD_MASK) discarded this round.
+    '''
+    return bin(self.discarded & self.rules.low_card_mask).count('1')
 
   def take_turn(self, player):
     '''
@@ -281,134 +534,90 @@ class Game:
     Each turn involves the following:
       - Discard 1 or more cards
       - Draw a card from the top of the deck or the top of the discard pile.
+    The players strategy makes the decisions.
     '''
-    global PLAYER_1, PLAYER_2, PLAYER_3, PLAYER_4, DISCARD_PILE, BETA
-    if not self.deck.cards:
+    strategy = player.strategy
+    deck_left = len(self.deck)
+    stuck = self.go_around >= MAX_GO_AROUNDS - 1
+    if (not deck_left and not stuck and self.reshuffles < self.rules.reshuffles and
+        len(self.discard_pile) > 1): # Deck is empty but the rules allow shuffling the discards back in
+      self.reshuffle_discards()
+      deck_left = len(self.deck)
+    if not deck_left or stuck: # Deck is empty or the round is stuck
+      if self.events is not None:
+        self.events.turn(self, player, deck_left, (), -1, 'empty deck')
       self.end_round()
-    elif player.get_hand_value() <= 7: # If the players hand is 7 points or below, call tunk and end the round
+    elif strategy.call_tunk(self, player): # Call tunk and end the round
+      if self.events is not None:
+        self.events.turn(self, player, deck_left, (), -1, 'tunk')
       self.call_tunk(player)
     else:
+      top_card_in_discard_pile = self.discard_pile.top()
+      discard_cards = strategy.discard(self, player, top_card_in_discard_pile)
+      for card in discard_cards:
+        player.remove_card(card)
 
-# ---------------------------- Begin discarding cards section ----------------------------------------------
-
-      fh.write(player.name + '\'s turn:\n')
-
-      # Discard either any cards that are multiples or highest value card in the current players hand
-
-      discard_cards = [] # Stores the cards to be discarded, needed to keep card ordering in the discard pile correct
-
-      card_counts = Counter(player.hand).most_common(5) # Count the number of occurrences of each card in a players hand
-      most_common_card = card_counts[0][0]               # Get the first card
-      most_common_card_count = card_counts[0][1]         # Get the number of occurrences of the first card
-      for card_occurrences in card_counts:             # Loop through the remaining occurrences, if the # of occurrences of that card >= #
-                                                              #   of occurrences of the most common card and the value is greater, set the current card as the most common
-        if card_occurrences[0].value > most_common_card.value and card_occurrences[1] >= most_common_card_count:
-          most_common_card = card_occurrences[0]
-          most_common_card_count = card_occurrences[1]
-      if most_common_card_count > 1 and most_common_card.value > 5: # If the hand has multiples, discard all of them
-        for i in range(most_common_card_count):
-          discard_cards.append(player.hand.pop(player.hand.index(most_common_card)))
-      else: # If the hand does not have multiples, discard the highest value card in the hand.
-        highest_card = player.get_highest_card() # Get the card to discard from the players hand
-        player.hand.remove(highest_card) # Remove the highest card from the players hand
-        discard_cards.append(highest_card) # Discard card(s)
-
-# --------------------------- Begin strategies about picking up cards section ------------------------------
-
-      top_card_in_discard_pile = DISCARD_PILE.pop()
-      if not player.hand: # Player has 1 card left in their hand
-        if top_card_in_discard_pile.value < discard_cards[0].value: # Check the card in their hand against the top card in the discard pile
-          draw_card = top_card_in_discard_pile # Take the top card in the discard pile if it is lower than the card in their hand
-          drawn_from = 'discard pile'
-        else:
-          draw_card = self.deck.draw() # If not lower take the top card from the deck
-          drawn_from = 'deck'
-      elif player.strategy == 'expert': # Consider top discard pile card under beta or draw from deck
-        # ADD IF THE CARD JUST DISCARDED IS A MATCH WITH THE HIGHEST CARD IN THE HAND, DRAW THE DISCARD CARD
-        # AND DROP THE NEXT HIGHEST CARD IN THE HAND
-        if len(discard_cards) == 1 and discard_cards[0].value == top_card_in_discard_pile.value: # Highest card is a match with the card in the discard pile and the player will want to drop two cards
-          next_highest_card = player.get_highest_card() # Get the next highest card to discard from the players hand
-          player.hand.remove(next_highest_card) # Remove the next highest card from the players hand
-          discard_cards.remove(highest_card)
-          player.hand.append(highest_card) # The player wants to keep the highest card in their hand
-          discard_cards.append(next_highest_card) # Discard the next highest card in the players hand
-          draw_card = top_card_in_discard_pile # Take the top card from the discard pile
-          drawn_from = 'discard pile'
-        else:
-          card_matches = False
-          for card in player.hand: # Check if the top card in the discard pile matches anything in the current players hand
-            if top_card_in_discard_pile == card:
-              card_matches = True
-          if player.name == 'player_1' and (card_matches or (top_card_in_discard_pile.value < PLAYER_1_BETA and top_card_in_discard_pile.value < player.get_highest_card().value)): # Discard card value must be lower than the
-                                                                                                                                                                           # highest card in the players hand and below beta
-            draw_card = top_card_in_discard_pile # Take the top card from the discard pile
-            drawn_from = 'discard pile'
-          elif card_matches or (top_card_in_discard_pile.value < BETA and top_card_in_discard_pile.value < player.get_highest_card().value): # Discard card value must be lower than the
-                                                                                                                                             # highest card in the players hand and below beta
-            draw_card = top_card_in_discard_pile # Take the top card from the discard pile
-            drawn_from = 'discard pile'
-          else:
-            DISCARD_PILE.append(top_card_in_discard_pile) # Put the top card from the discard pile back
-            draw_card = self.deck.draw()        # Draw the next card from the deck
-            drawn_from = 'deck'
-      elif player.strategy == 'intermediate': # Consider top discard pile if lower than current highest card
-        if top_card_in_discard_pile.value < discard_cards[0].value:
-          draw_card = top_card_in_discard_pile # Take the top card from the discard pile
-          drawn_from = 'discard pile'
-        else:
-          DISCARD_PILE.append(top_card_in_discard_pile) # Put the top card from the discard pile back
-          draw_card = self.deck.draw()        # Draw the next card from the deck
-          drawn_from = 'deck'
-      else: # strategy is basic strategy
-        DISCARD_PILE.append(top_card_in_discard_pile) # Put the top card from the discard pile back
+      if not player.hand: # Player has discarded their last card
+        take = player.card_values[top_card_in_discard_pile] < player.card_values[discard_cards[0]] # Take the top card in the discard pile if it is lower
+      else:
+        take = strategy.draw(self, player, discard_cards, top_card_in_discard_pile)
+      if take:
+        draw_card = self.discard_pile.pop() # Take the top card from the discard pile
+        drawn_from = 'discard pile'
+      else:
         draw_card = self.deck.draw()        # Draw the next card from the deck
         drawn_from = 'deck'
       for card in discard_cards:
-        fh.write(player.name + ' is discarding ' + card.__str__() + '\n')
-        DISCARD_PILE.append(card) # Discard the highest card
-      fh.write(player.name + ' drew ' + draw_card.__str__() + ' from the ' + drawn_from + '\n')
-      player.hand.append(draw_card)  # Put the drawn card in the players hand
-      fh.write('\n')
+        self.discard_pile.push(card) # The last card discarded ends up on top
+        self.discarded |= 1 << card
+        self.shown |= 1 << card
+      player.add_card(draw_card)  # Put the drawn card in the players hand
+      if self.events is not None:
+        self.events.turn(self, player, deck_left, discard_cards, draw_card, drawn_from)
 
   def play_game(self):
     '''
     Runs the game of tunk.
     Keeps track of the number of rounds and the cards left in the deck.
     '''
-    global GAME_OVER, WINS, LOSSES, SCORE_COUNTS, go_around, round_count
-    SCORE_COUNTS = numpy.zeros((50, 500)) #track average scores... rows are rounds columns are go arounds
-    round_count = 0
-    spot_on_table = 1 #keep track of which players turn it is easily
-    sum_scores = 0 #store sum of scores after each go around
-
-    while not GAME_OVER:
-      round_count += 1
-      go_around = 0
-      fh.write('Round ' + str(round_count) + '\n')
-      # for player in TURN_ORDER:
+    self.trajectory = []
+    self.round_count = 0
+    self.spot_on_table = 1
+    num_players = len(self.players)
+
+    while not self.game_over:
+      self.round_count += 1
+      self.go_around = 0
+      if self.events is not None:
+        self.events.round_start(self)
+      # for player in self.players:
         # fh.write(player.name + ' score: ' + str(player.score) + '\n') # # # fh.write each players current score
       # fh.write('Dealing players hands.\n')
       # fh.write('\n')
-      self.deck = Deck() # Create a new deck each round
+      self.deck.shuffle(self.round_count) # Start a new deck each round
+      self.discard_pile.reset()
+      self.discarded = 0
+      self.reshuffles = 0
       self.deal()        # Redeal players hands
-      DISCARD_PILE.append(self.deck.cards.pop()) # Put top card on the deck in the discard pile for first player to consider
-      while not ROUND_OVER:
-        fh.write('Cards left in the deck: ' + str(len(self.deck.cards)) + '\n')  # # # fh.write the number of cards left in the deck
-        fh.write('spot ' + str(spot_on_table) + '\n')
-        fh.write(str(self.whose_turn) + '\n')
+      self.discard_pile.push(self.deck.draw()) # Put top card on the deck in the discard pile for first player to consider
+      self.shown = 1 << self.discard_pile.top()
+      while not self.round_over:
         self.take_turn(self.whose_turn)
-        if spot_on_table < 4:
-            spot_on_table += 1
+        self.turn_count += 1
+        if self.spot_on_table < num_players:
+            self.spot_on_table += 1
         else:
-            sum_scores = PLAYER_1.get_hand_value()+PLAYER_2.get_hand_value()+PLAYER_3.get_hand_value()+PLAYER_4.get_hand_value()
-            SCORE_COUNTS[round_count-2,go_around] = sum_scores*1./4 #add score for this go around of the round to the array
-            spot_on_table = 1
-            go_around += 1
-            fh.write('hello, the go around ' + str(go_around) + ' average was: ' + str(sum_scores*1./4) + '\n') #write avg after each go around
+            hand_values = tuple([player.hand_value for player in self.players])
+            self.trajectory.append((self.round_count, self.go_around, hand_values)) #add the hand values for this go around of the round
+            self.spot_on_table = 1
+            self.go_around += 1
+            if self.events is not None:
+              self.events.go_around(self, sum(hand_values)*1./num_players) #log avg after each go around
         # fh.write('\n')
         self.whose_turn = self.next_player(self.whose_turn) # Set the next players turn
       (losing_players, winning_players) = self.is_game_over() # Check if the game is over
-    fh.write('Game is over.\n')
+    if self.events is not None:
+      self.events.game_over(self)
     # fh.write('Players who lost:\n')
     # for player in losing_players:
       # fh.write(player.name + ' lost with a score of ' + str(player.score) + ' points.\n')
@@ -416,15 +625,16 @@ class Game:
     # fh.write('Players who won:\n')
     # for player in winning_players:
       # fh.write(player.name + ' won with a score of ' + str(player.score) + ' points.\n')
-    for player in TURN_ORDER:
-      if player in losing_players:
-        LOSSES[player.number] += 1
-      else:
-        WINS[player.number] += 1
+    for sink in self.sinks:
+      sink.record_game(self, losing_players, winning_players)
 
 
 if __name__ == '__main__':
-  global fh
+  # python Tunk_Simulator.py [root seed], game j of matchup i gets the same seed as in Tunk_Tournament
+  import sys
+  import Tunk_Events
+  root_seed = int(sys.argv[1]) if len(sys.argv) > 1 else numpy.random.SeedSequence().entropy
+  print('root seed ' + str(root_seed))
   file_1 = "tunk_output_basic.txt"
   file_2 = "tunk_output_intermediate.txt"
   file_3 = "tunk_output_expert.txt"
@@ -451,72 +661,36 @@ if __name__ == '__main__':
 
   #-------------------------------- Comparing strategies against each other----------------------------------------------------
   for i in range(0,9): #pick the combination of strategies
-    fh = open(files[2], "w")
+    fh = open(files[i], "w")
+    event_fh = open(files[i] + '.events', "wb") # Binary turn log, python Tunk_Events.py <file>.events prints the transcript
+    events = Tunk_Events.BinaryEventSink(event_fh)
+    results = WinLossSink()
+    score_counts = ScoreCountSink() # Totals of the score counts across all games
+    seeds = Tunk_Seeding.game_seeds(root_seed, numpy.arange(1000), stream=(i,))
     for j in range(1000): #pick games to play wth each strategy
-      game = Game(strategies[2])
+      game = Game(strategies[i], sinks=[results, score_counts], events=events, game_id=j, seed=int(seeds[j]))
       game.play_game()
       # fh.write('\n')
       # fh.write('GAME DATA: \n')
       # fh.write('Rounds: ' + str(round_count) + '\n')
       # fh.write('Score Counts: \n')
 
-      # TAKE THE SCORE COUNTS FROM EACH ROUND OF THIS GAME AND AVERAGE THEM
-      # THEN ADD THIS TO CALLING_ARRAY SO WE CAN KEEP TRACK OF TOTALS ACROSS ALL GAMES
-      CALLING_ARRAY[j,:] = SCORE_COUNTS.sum(0)*1./round_count
-      print(str(i) + ' ' + str(j))
-      if go_around > 100:
-        print(str(i))
+      if (j+1) % 100 == 0:
+        print(str(i) + ' ' + str(j+1) + ' games')
+      if game.go_around > 100:
+        print(str(i) + ' game ' + str(j) + ' seed ' + str(game.seed) + ', replay with python Tunk_Replay.py --seed ' + str(game.seed) + ' ' + ','.join(strategies[i]))
 
 
-      # fh.write(str(SCORE_COUNTS) + '\n')
-      GAME_OVER = False
+      # fh.write(str(game.trajectory) + '\n')
     # fh.write('\n')
-    for player in TURN_ORDER:
-      fh.write( player.name + ' wins: ' + str(WINS[player.number]) + '\n')
-      fh.write(player.name + ' losses: ' + str(LOSSES[player.number]) + '\n')
-      fh.write(player.name + ' win ratio: ' + str(WINS[player.number]*1./10000) + '\n')
+    for player in game.players:
+      fh.write( player.name + ' wins: ' + str(results.wins[player.number]) + '\n')
+      fh.write(player.name + ' losses: ' + str(results.losses[player.number]) + '\n')
+      fh.write(player.name + ' win ratio: ' + str(results.wins[player.number]*1./results.num_games) + '\n')
       fh.write('\n')
     fh.close()
-    LOSSES = [0,0,0,0]
-    WINS = [0,0,0,0]
-    print('Restarted iteration, LOSSES = ' + str(LOSSES[0]) + ', WINS = ' + str(WINS[0]))
+    events.flush()
+    event_fh.close()
 
 # --------------------- Comparing player_1 with changing beta against 3 other expert players with constant beta values ------------------------------
-##  fh = open('Expert_Beta_Value_Test', "w")
-##  for i in range(0,11): #pick the combination of strategies
-##    PLAYER_1_BETA = i
-##    fh.write('Player_1_BETA = ' + str(PLAYER_1_BETA) + '\n')
-##    for j in range(10): #pick games to play wth each strategy
-##      game = Game(strategies[3])
-##      game.play_game()
-##      # fh.write('\n')
-##      # fh.write('GAME DATA: \n')
-##      # fh.write('Rounds: ' + str(round_count) + '\n')
-##      # fh.write('Score Counts: \n')
-##
-##      # TAKE THE SCORE COUNTS FROM EACH ROUND OF THIS GAME AND AVERAGE THEM
-##      # THEN ADD THIS TO CALLING_ARRAY SO WE CAN KEEP TRACK OF TOTALS ACROSS ALL GAMES
-##      CALLING_ARRAY[j,:] = SCORE_COUNTS.sum(0)*1./round_count
-##      # fh.write(str(SCORE_COUNTS) + '\n')
-##      GAME_OVER = False
-##    fh.write('\n')
-##    for player in TURN_ORDER:
-##      fh.write( player.name + ' wins: ' + str(WINS[player.number]) + '\n')
-##      fh.write(player.name + ' losses: ' + str(LOSSES[player.number]) + '\n')
-##      fh.write(player.name + ' win ratio: ' + str(WINS[player.number]*1./11) + '\n')
-##      fh.write('\n')
-##    CALLING_ARRAY.sum(0)*1./11
-##    fh.write('Average hand score per table go around: ' + str(CALLING_ARRAY) + '\n')
-##    CALLING_ARRAY = numpy.zeros((11, 25))
-##    LOSSES = [0,0,0,0]
-##    WINS = [0,0,0,0]
-##    print('Restarted iteration, LOSSES = ' + str(LOSSES[0]) + ', WINS = ' + str(WINS[0]))
-##
-##  fh.close()
-
-
-
-
-
-
-
+# This experiment is now run by Tunk_Sweep.py (python Tunk_Sweep.py writes Expert_Beta_Value_Test)
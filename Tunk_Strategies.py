@@ -0,0 +1,375 @@
+'''
+Strategies of the Tunk players.
+
+A strategy makes three decisions on a player's turn:
+  call_tunk - whether to call tunk instead of taking a turn
+  discard   - which cards to discard, knowing the top card of the discard pile
+  draw      - whether to take the top card of the discard pile instead of drawing from the deck
+Tunk_Simulator.Game asks the strategy of the current player once per turn. Each decision
+also has a vectorized batch form (call_tunk_batch, discard_batch, draw_batch), which
+Tunk_Batch.BatchGame calls once per step with the rows of every game where one of the
+strategy's players is up, so the batch engine never makes a Python call per player per turn.
+
+Strategies are registered by name, games can be set up with names or Strategy objects.
+'''
+
+import numpy
+
+import Tunk_Counting
+import Tunk_Simulator
+
+
+DECISIONS = (('call_tunk', 'call_tunk_batch'), ('discard', 'discard_batch'), ('draw', 'draw_batch'))
+PAIR_VALUE = 6   # Multiples are discarded when they are worth at least this much
+CALL_CONFIDENCE = 0.95  # The counting strategy calls tunk when its chance of having the lowest hand is at least this
+MAX_CALL_VALUE = 20     # and its hand is worth at most this
+DRAW_MARGIN = -2.       # It takes the top discard when it is worth less than the average unseen card plus this
+STRATEGIES = {}   # Name -> Strategy class (or anything called with the seat's parameters that returns a Strategy)
+
+
+def register_strategy(name, factory):
+  '''
+  Makes a strategy available by name. factory is called with the keyword parameters of
+  the seat (beta, tunk_call_value, oracle) and returns a Strategy.
+  '''
+  if name in STRATEGIES:
+    raise ValueError('A strategy named ' + name + ' is already registered')
+  STRATEGIES[name] = factory
+  return factory
+
+
+def make_strategy(strategy, **params):
+  '''
+  The Strategy for a name with the given parameters, Strategy objects are returned as they are.
+  '''
+  if isinstance(strategy, Strategy):
+    return strategy
+  if strategy not in STRATEGIES:
+    raise ValueError('Unknown strategy: ' + str(strategy))
+  return STRATEGIES[strategy](**params)
+
+
+def seat_strategies(strategies, beta=None, player_1_beta=None, tunk_call_value=None, oracle=None):
+  '''
+  One Strategy per seat from a list of names (or Strategy objects).
+  The player in the first seat plays with player_1_beta and the others with beta.
+  Seats with the same name and parameters share one Strategy object.
+  '''
+  beta = beta if beta is not None else Tunk_Simulator.BETA
+  player_1_beta = player_1_beta if player_1_beta is not None else Tunk_Simulator.PLAYER_1_BETA
+  made = {}
+  seats = []
+  for number, strategy in enumerate(strategies):
+    seat_beta = player_1_beta if number == 0 else beta
+    key = (strategy, seat_beta) if not isinstance(strategy, Strategy) else id(strategy)
+    if key not in made:
+      made[key] = make_strategy(strategy, beta=seat_beta, tunk_call_value=tunk_call_value, oracle=oracle)
+    seats.append(made[key])
+  return seats
+
+
+class Strategy:
+  '''
+  Base strategy: call tunk at or below tunk_call_value, discard multiples worth at least
+  pair_value (more than 5) or else the highest card, and always draw from the deck.
+  Subclasses override the decisions they change, a strategy can only be played by the
+  batch engine if the batch forms are overridden along with the scalar ones (has_batch_form).
+  Seats whose strategies have equal batch_group() keys are decided together by one of them,
+  so the batch forms read beta per seat with beta_batch().
+  Strategies that set counts_cards read which cards were turned face up (see Tunk_Counting),
+  the batch engine only keeps track of them when one of its strategies does.
+  '''
+  name = None
+  pair_value = PAIR_VALUE
+  counts_cards = False
+
+  def __init__(self, beta=None, tunk_call_value=None, oracle=None):
+    self.beta = beta if beta is not None else Tunk_Simulator.BETA
+    self.tunk_call_value = tunk_call_value if tunk_call_value is not None else Tunk_Simulator.TUNK_CALL_VALUE
+    self.oracle = oracle
+
+  def has_batch_form(self):
+    '''
+    True if every decision is overridden in its batch form no higher up the class tree than
+    in its scalar form, so the batch engine makes the same decisions as the scalar one.
+    '''
+    classes = type(self).__mro__
+    for (scalar, batch) in DECISIONS:
+      defined = [index for index, cls in enumerate(classes) if scalar in cls.__dict__][0]
+      if not any(batch in cls.__dict__ for cls in classes[:defined+1]):
+        return False
+    return True
+
+  def batch_group(self):
+    return (type(self), self.tunk_call_value, id(self.oracle))
+
+  def call_tunk(self, game, player):
+    return player.get_hand_value() <= self.tunk_call_value # If the players hand is 7 points or below, call tunk
+
+  def discard(self, game, player, top_card):
+    '''
+    Returns the cards to discard in hand order: every card of the most common rank if it
+    has multiples worth at least pair_value, otherwise the highest value card.
+    '''
+    card_values = player.card_values
+    if player.multiples: # Among the ranks with multiples take the most common, then the highest value, then the first in the hand
+      hand = player.hand
+      rank_counts = player.rank_counts
+      most_common_rank = None
+      for rank in player.multiples:
+        first_card = next(iter(player.rank_cards[rank]))
+        key = (rank_counts[rank], card_values[first_card], -hand[first_card])
+        if most_common_rank is None or key > most_common_key:
+          most_common_rank = rank
+          most_common_key = key
+      if most_common_key[1] >= self.pair_value: # If the hand has multiples, discard all of them
+        return list(player.rank_cards[most_common_rank])
+    return [player.get_highest_card()] # If the hand does not have multiples, discard the highest value card in the hand.
+
+  def draw(self, game, player, discards, top_card):
+    '''
+    Returns True to take top_card from the discard pile, False to draw from the deck.
+    The discards are already out of the players hand.
+    '''
+    return False
+
+  def call_tunk_batch(self, game, games, players, hand_values):
+    '''
+    Tunk call decisions for the given players of the given games of a BatchGame.
+    '''
+    return hand_values <= self.tunk_call_value
+
+  def discard_batch(self, game, turn, rows):
+    '''
+    Discard masks (one row of hand slots per game) for the given rows of a Tunk_Batch.Turn.
+    '''
+    return self.default_discard_batch(game, turn, rows)[0]
+
+  def default_discard_batch(self, game, turn, rows):
+    '''
+    (discard masks, True where they are multiples, value of the discarded cards) of the
+    default discard for the given rows of a Tunk_Batch.Turn.
+    '''
+    return (turn.discard[rows], turn.multiples[rows], turn.discard_value[rows])
+
+  def beta_batch(self, game, turn, rows):
+    '''
+    beta of the player of each of the given rows of a Tunk_Batch.Turn.
+    '''
+    return game.seat_values('beta')[turn.players[rows]]
+
+  def draw_batch(self, game, turn, rows, discard):
+    '''
+    True where the player takes the top card of the discard pile, for the given rows of a
+    Tunk_Batch.Turn and the discard masks returned by discard_batch.
+    '''
+    return numpy.zeros(len(turn.top_value[rows]), dtype=bool)
+
+
+class BasicStrategy(Strategy):
+  '''
+  Always draws from the deck.
+  '''
+  name = 'basic'
+
+
+class IntermediateStrategy(Strategy):
+  '''
+  Takes the top discard if it is lower than what they discarded.
+  '''
+  name = 'intermediate'
+
+  def draw(self, game, player, discards, top_card):
+    return player.card_values[top_card] < player.card_values[discards[0]]
+
+  def draw_batch(self, game, turn, rows, discard):
+    return turn.top_value[rows] < numpy.where(discard, turn.values[rows], -1).max(1)
+
+
+class ExpertStrategy(Strategy):
+  '''
+  If the highest card is worth the same as the top discard, keeps it, discards the next highest
+  and takes the top discard to pair with it. Otherwise takes the top discard if it matches a
+  card in the hand, or is under beta and lower than the highest card.
+  '''
+  name = 'expert'
+
+  def discard(self, game, player, top_card):
+    discards = Strategy.discard(self, game, player, top_card)
+    card_values = player.card_values
+    if len(discards) == 1 and len(player.hand) > 1 and card_values[discards[0]] == card_values[top_card]:
+      discards = [player.get_next_highest_card()] # Keep the highest card to pair with the top discard
+    return discards
+
+  def draw(self, game, player, discards, top_card):
+    top_card_value = player.card_values[top_card]
+    highest_value = player.highest_value
+    if len(discards) == 1 and highest_value == top_card_value: # Pairs with the highest card kept by discard
+      return True
+    card_matches = player.rank_counts[player.card_ranks[top_card]] > 0 # Check if the top card in the discard pile matches anything in the current players hand
+    return card_matches or (top_card_value < self.beta and top_card_value < highest_value) # Discard card value must be lower than the
+                                                                                           # highest card in the players hand and below beta
+
+  def discard_batch(self, game, turn, rows):
+    (discard, multiples, discard_value) = self.default_discard_batch(game, turn, rows)
+    discard = discard.copy()
+    valid = turn.valid[rows]
+    swap = ~multiples & (turn.top_value[rows] == discard_value) & (valid.sum(1) > 1)
+    swapped = numpy.flatnonzero(swap)
+    next_highest_slot = turn.highest_slots(turn.values[rows][swapped], valid[swapped] & ~discard[swapped])
+    discard[swapped] = False
+    discard[swapped, next_highest_slot] = True
+    return discard
+
+  def draw_batch(self, game, turn, rows, discard):
+    remaining = turn.valid[rows] & ~discard
+    top_value = turn.top_value[rows]
+    highest_value = numpy.where(remaining, turn.values[rows], -1).max(1)
+    pairs = (discard.sum(1) == 1) & (highest_value == top_value)
+    matches = (remaining & (turn.ranks[rows] == turn.top_rank[rows][:, None])).any(1)
+    beta = self.beta_batch(game, turn, rows)
+    under_beta = (top_value < beta) & (top_value < highest_value)
+    return pairs | matches | under_beta
+
+
+class OptimalStrategy(ExpertStrategy):
+  '''
+  Plays like expert but asks oracle (a Tunk_Oracle.OracleTable) when to call tunk.
+  '''
+  name = 'optimal'
+
+  def __init__(self, beta=None, tunk_call_value=None, oracle=None):
+    if oracle is None:
+      raise ValueError('The optimal strategy needs an oracle table')
+    ExpertStrategy.__init__(self, beta, tunk_call_value, oracle)
+
+  def call_tunk(self, game, player):
+    return self.oracle.should_call(player.get_hand_value(), len(game.deck), game.low_discards())
+
+  def call_tunk_batch(self, game, games, players, hand_values):
+    return self.oracle.should_call_batch(hand_values, game.deck_left(games), game.low_discards(games))
+
+
+class TunedStrategy(ExpertStrategy):
+  '''
+  Plays like expert with every rule tunable, the strategy Tunk_Optimizer searches over:
+    beta            - takes the top discard under this value, like expert
+    pair_value      - discards multiples worth at least this much
+    tunk_call_value - calls tunk at or below this hand value when the round starts,
+    tunk_call_late  - moving in a straight line to this value as the deck runs out
+  Each parameter is a number, or for the batch engine an array with one value per game,
+  so one BatchGame can play many settings side by side. With the defaults it plays
+  exactly like expert.
+  '''
+  name = 'tuned'
+
+  def __init__(self, beta=None, tunk_call_value=None, oracle=None, pair_value=PAIR_VALUE, tunk_call_late=None):
+    ExpertStrategy.__init__(self, beta, tunk_call_value, oracle)
+    self.pair_value = pair_value
+    self.tunk_call_late = tunk_call_late if tunk_call_late is not None else self.tunk_call_value
+
+  def batch_group(self):
+    return (type(self), id(self))   # The batch forms read the parameters of this object, not the seat's
+
+  def value(self, name, games):
+    '''
+    The parameter for the given games of a BatchGame.
+    '''
+    value = getattr(self, name)
+    return value if numpy.ndim(value) == 0 else value[games]
+
+  def tunk_threshold(self, tunk_call_value, tunk_call_late, deck_left, deck_start):
+    played = 1. - deck_left*1./deck_start   # Share of the deck drawn since the deal
+    return tunk_call_value + (tunk_call_late - tunk_call_value)*played
+
+  def call_tunk(self, game, player):
+    rules = game.rules
+    deck_start = rules.deck_size - rules.num_players*rules.hand_size - 1
+    return player.get_hand_value() <= self.tunk_threshold(self.tunk_call_value, self.tunk_call_late, len(game.deck), deck_start)
+
+  def call_tunk_batch(self, game, games, players, hand_values):
+    deck_start = game.deck_size - game.num_players*game.hand_size - 1
+    threshold = self.tunk_threshold(self.value('tunk_call_value', games), self.value('tunk_call_late', games),
+                                    game.deck_left(games), deck_start)
+    return hand_values <= threshold
+
+  def default_discard_batch(self, game, turn, rows):
+    return turn.pair_discard(rows, self.value('pair_value', turn.games[rows]))
+
+  def beta_batch(self, game, turn, rows):
+    return self.value('beta', turn.games[rows])
+
+
+class CountingStrategy(ExpertStrategy):
+  '''
+  Discards like expert and counts cards (Tunk_Counting) for the rest:
+    call_tunk - calls tunk when the hand is worth at most max_call_value and the chance that no
+                opponent's hand is lower, from their known cards and the unseen cards, is at
+                least call_confidence
+    draw      - takes the top discard when it pairs like expert, or when it is lower than the
+                highest card kept and than the average unseen card (what a draw from the deck
+                is worth on average) plus draw_margin
+  '''
+  name = 'counting'
+  counts_cards = True
+
+  def __init__(self, beta=None, tunk_call_value=None, oracle=None, call_confidence=CALL_CONFIDENCE,
+               max_call_value=MAX_CALL_VALUE, draw_margin=DRAW_MARGIN):
+    ExpertStrategy.__init__(self, beta, tunk_call_value, oracle)
+    self.call_confidence = call_confidence
+    self.max_call_value = max_call_value
+    self.draw_margin = draw_margin
+    self.counter = None
+
+  def batch_group(self):
+    return (type(self), self.call_confidence, self.max_call_value, self.draw_margin)
+
+  def card_counter(self, rules):
+    if self.counter is None or self.counter.rules is not rules:
+      self.counter = Tunk_Counting.card_counter(rules, self.max_call_value)
+    return self.counter
+
+  def call_tunk(self, game, player):
+    hand_value = player.hand_value
+    if hand_value > self.max_call_value:
+      return False
+    return self.card_counter(game.rules).win_probability(game, player, hand_value) >= self.call_confidence
+
+  def draw(self, game, player, discards, top_card):
+    top_card_value = player.card_values[top_card]
+    highest_value = player.highest_value
+    if len(discards) == 1 and highest_value == top_card_value: # Pairs with the highest card kept by discard
+      return True
+    if player.rank_counts[player.card_ranks[top_card]] > 0:
+      return True
+    if top_card_value >= highest_value:
+      return False
+    counter = self.card_counter(game.rules)
+    hand_mask = player.hand_mask
+    for card in discards:
+      hand_mask |= 1 << card
+    (unseen, total) = counter.value_total(counter.unseen(game, hand_mask))
+    return top_card_value < total/unseen + self.draw_margin
+
+  def call_tunk_batch(self, game, games, players, hand_values):
+    call = numpy.zeros(len(games), dtype=bool)
+    rows = numpy.flatnonzero(hand_values <= self.max_call_value)
+    if len(rows):
+      counter = self.card_counter(game.rules)
+      call[rows] = counter.win_probability_batch(game, games[rows], players[rows], hand_values[rows]) >= self.call_confidence
+    return call
+
+  def draw_batch(self, game, turn, rows, discard):
+    remaining = turn.valid[rows] & ~discard
+    top_value = turn.top_value[rows]
+    highest_value = numpy.where(remaining, turn.values[rows], -1).max(1)
+    pairs = (discard.sum(1) == 1) & (highest_value == top_value)
+    matches = (remaining & (turn.ranks[rows] == turn.top_rank[rows][:, None])).any(1)
+    counter = self.card_counter(game.rules)
+    (unseen, total) = counter.value_total_batch(counter.unseen_batch(game, turn.games[rows], turn.hands[rows]))
+    under_average = (top_value < highest_value) & (top_value < total/unseen + self.draw_margin)
+    return pairs | matches | under_average
+
+
+for strategy_class in (BasicStrategy, IntermediateStrategy, ExpertStrategy, OptimalStrategy, TunedStrategy, CountingStrategy):
+  register_strategy(strategy_class.name, strategy_class)
@@ -0,0 +1,195 @@
+'''
+Parameter sweeps over the batch engine.
+
+A sweep plays the same matchup at many parameter points:
+  player_1_beta   - beta of the expert in seat 1
+  beta            - beta of the other expert seats
+  tunk_call_value - players call tunk at or below this hand value
+  threshhold      - score at which a player loses the game
+Every point plays the same game seeds (common random numbers), so all points see the
+same deals and differences between nearby points can be measured with paired
+per-game comparisons instead of needing independent samples for each point.
+'''
+
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy
+
+import Tunk_Batch
+import Tunk_Checkpoint
+import Tunk_Seeding
+import Tunk_Tournament
+from Tunk_Tournament import SHARD_SIZE, Z_95, shard_games, wilson_interval
+
+
+PARAMETERS = ('player_1_beta', 'beta', 'tunk_call_value', 'threshhold')
+LOSERS_FILE = 'losers.npy'   # Losers of every game of a checkpointed sweep
+
+
+def grid(**axes):
+  '''
+  Every combination of the given parameter values, e.g. grid(player_1_beta=range(11), beta=[5,6]).
+  '''
+  names = list(axes)
+  return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def random_points(num_points, rng=None, **ranges):
+  '''
+  num_points points with each parameter drawn uniformly from its inclusive (low, high) range.
+  '''
+  rng = rng if rng is not None else numpy.random.default_rng()
+  values = dict((name, rng.integers(low, high, num_points, endpoint=True)) for name, (low, high) in ranges.items())
+  return [dict((name, int(values[name][i])) for name in ranges) for i in range(num_points)]
+
+
+class SweepResult:
+  '''
+  losers[point, game, seat] is True if the seat lost that game at that point.
+  The same game index is the same deals at every point.
+  '''
+  def __init__(self, strategies, points, losers, seed):
+    self.strategies = strategies
+    self.points = points
+    self.losers = losers
+    self.seed = seed
+
+  @property
+  def num_games(self):
+    return self.losers.shape[1]
+
+  def wins(self):
+    return (~self.losers).sum(1)
+
+  def win_ratios(self):
+    return self.wins()*1./self.num_games
+
+  def confidence_intervals(self, z=Z_95):
+    '''
+    Wilson intervals of every point's win ratios, as (low, high) arrays of shape (points, seats).
+    '''
+    return wilson_interval(self.wins(), self.num_games, z)
+
+  def paired_difference(self, point_a, point_b, seat=0, z=Z_95):
+    '''
+    Difference in the seat's win ratio between two points, with a confidence interval
+    from the per game differences (the games are paired by their shared seeds).
+    Returns (difference, low, high).
+    '''
+    difference = (~self.losers[point_a, :, seat]).astype(float) - (~self.losers[point_b, :, seat])
+    mean = difference.mean()
+    half_width = z*difference.std(ddof=1)/numpy.sqrt(self.num_games) if self.num_games > 1 else numpy.inf
+    return (mean, mean - half_width, mean + half_width)
+
+  def write(self, fh, seat=0):
+    '''
+    Writes a table of each point's win ratio for the given seat with its 95% interval.
+    '''
+    names = sorted(set(name for point in self.points for name in point))
+    ratios = self.win_ratios()
+    (low, high) = self.confidence_intervals()
+    fh.write('\t'.join(names + ['player_' + str(seat+1) + ' win ratio', 'low', 'high']) + '\n')
+    for index, point in enumerate(self.points):
+      row = [str(point.get(name, '')) for name in names]
+      row += ['%.4f' % ratios[index, seat], '%.4f' % low[index, seat], '%.4f' % high[index, seat]]
+      fh.write('\t'.join(row) + '\n')
+
+
+def play_point_shard(strategies, point, seeds, **kwargs):
+  '''
+  Plays the games with the given seeds at one parameter point and returns who lost them.
+  '''
+  result = Tunk_Batch.play_games(strategies, len(seeds), seeds=seeds, **dict(point, **kwargs))
+  return result.losers
+
+
+def run_sweep(strategies, points, num_games, seed=None, workers=None, shard_size=SHARD_SIZE, checkpoint=None, **kwargs):
+  '''
+  Plays num_games games of the matchup at every point (a dict of parameter values)
+  across workers processes and returns a SweepResult.
+  Extra keyword arguments are passed to Tunk_Batch.BatchGame for every point.
+  If checkpoint (a directory) is given the losers of every game are streamed to it
+  and the run can be resumed like Tunk_Tournament.run_tournament.
+  '''
+  points = [dict(point) for point in points]
+  for point in points:
+    for name in point:
+      if name not in PARAMETERS:
+        raise ValueError('Unknown sweep parameter: ' + name)
+  if checkpoint is not None:
+    checkpoint = Tunk_Checkpoint.Checkpoint(checkpoint)
+    seed = seed if seed is not None else checkpoint.saved_seed()
+  if seed is None:
+    seed = numpy.random.SeedSequence().entropy
+  if workers is None:
+    workers = os.cpu_count() or 1
+
+  seeds = Tunk_Seeding.game_seeds(seed, numpy.arange(num_games))
+  shape = (len(points), num_games, len(strategies))
+  done = set()   # Shards whose losers are stored
+  if checkpoint is None:
+    losers = numpy.zeros(shape, dtype=bool)
+  else:
+    spec = dict(strategies=list(strategies), points=points, num_games=num_games, seed=seed, shard_size=shard_size,
+                params=Tunk_Tournament.json_params(kwargs))
+    losers_path = os.path.join(checkpoint.directory, LOSERS_FILE)
+    resuming = checkpoint.exists()
+    state = checkpoint.start('sweep', spec, dict(done=[]))
+    done = set(state['done'])
+    if resuming:
+      losers = numpy.load(losers_path, mmap_mode='r+')
+    else:
+      losers = numpy.lib.format.open_memmap(losers_path, mode='w+', dtype=bool, shape=shape)
+
+  def save(**progress):
+    losers.flush()
+    checkpoint.save(done=sorted(done), **progress)
+
+  shards = []
+  shard_id = 0
+  for index, point in enumerate(points):
+    start = 0
+    for games in shard_games(num_games, shard_size):
+      if shard_id not in done:
+        shards.append((shard_id, index, start, games))
+      shard_id += 1
+      start += games
+
+  def store(shard, shard_losers):
+    (shard_id, index, start, games) = shard
+    losers[index, start:start+games] = shard_losers
+    done.add(shard_id)
+    if checkpoint is not None and checkpoint.due():
+      save()
+
+  if workers == 1:
+    for shard in shards:
+      (shard_id, index, start, games) = shard
+      store(shard, play_point_shard(strategies, points[index], seeds[start:start+games], **kwargs))
+  else:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+      futures = {}
+      for shard in shards:
+        (shard_id, index, start, games) = shard
+        futures[executor.submit(play_point_shard, strategies, points[index], seeds[start:start+games], **kwargs)] = shard
+      for future in as_completed(futures):
+        store(futures[future], future.result())
+  if checkpoint is not None:
+    save(finished=True)
+  return SweepResult(list(strategies), points, losers, seed)
+
+
+if __name__ == '__main__':
+  # Comparing player_1 with changing beta against 3 other expert players with constant beta values
+  # python Tunk_Sweep.py [checkpoint directory]
+  checkpoint = sys.argv[1] if len(sys.argv) > 1 else None
+  result = run_sweep(['expert','expert','expert','expert'], grid(player_1_beta=range(0, 11)), 10000, checkpoint=checkpoint)
+  fh = open('Expert_Beta_Value_Test', "w")
+  result.write(fh)
+  fh.close()
+  for index, point in enumerate(result.points[1:], 1):
+    (difference, low, high) = result.paired_difference(index, index-1)
+    print('player_1_beta ' + str(point['player_1_beta']) + ' vs ' + str(point['player_1_beta']-1) + ': ' + '%+.4f (%+.4f, %+.4f)' % (difference, low, high))
@@ -0,0 +1,470 @@
+'''
+Runs tournaments of Tunk games across all cores.
+
+Each matchup is split into shards of games. Shards are played by the batch engine
+in Tunk_Batch in separate worker processes and the partial win/loss counts and score
+count sums they send back are merged in the parent. Every game's seed only depends on
+the root seed, the matchup index and the game's number in the matchup (see Tunk_Seeding),
+so a run gives the same results for any number of workers and any game can be replayed.
+run_adaptive_tournament instead keeps playing shards of the matchups whose win
+ratios are still uncertain and stops each matchup once it is precise enough.
+Per game and per go around rows can also be written to a Tunk_Results directory.
+Tunk_CLI (./tunk-sim) runs tournaments from a spec or the command line.
+'''
+
+import os
+import sys
+
+import numpy
+
+import Tunk_Batch
+import Tunk_Checkpoint
+import Tunk_Results
+import Tunk_Rules
+import Tunk_Seeding
+import Tunk_Trajectories
+
+
+MATCHUPS = {
+  'tunk_output_basic.txt': ['basic','basic','basic','basic'],
+  'tunk_output_intermediate.txt': ['intermediate','intermediate','intermediate','intermediate'],
+  'tunk_output_expert.txt': ['expert','expert','expert','expert'],
+  'tunk_output_basic_vs_intermediate': ['basic','intermediate','intermediate','intermediate'],
+  'tunk_output_basic_vs_expert': ['basic','expert','expert','expert'],
+  'tunk_output_intermediate_vs_basic': ['intermediate','basic','basic','basic'],
+  'tunk_output_intermediate_vs_expert': ['intermediate','expert','expert','expert'],
+  'tunk_output_expert_vs_basic': ['expert','basic','basic','basic'],
+  'tunk_output_expert_vs_intermediate': ['expert','intermediate','intermediate','intermediate'],
+}
+
+SHARD_SIZE = 2000
+UNSTORED_PARAMS = ('oracle', 'rng')   # Not stored with a run, the oracle is loaded again and games always have seeds
+RESULT_TABLES = ('games', 'go_arounds')
+Z_95 = 1.959964   # Normal quantile of a two sided 95% confidence interval
+
+
+def wilson_interval(wins, num_games, z=Z_95):
+  '''
+  Wilson score confidence interval of a win ratio, works on numpy arrays.
+  Returns (low, high).
+  '''
+  wins = numpy.asarray(wins, dtype=float)
+  n = numpy.maximum(numpy.asarray(num_games, dtype=float), 1)
+  ratio = wins/n
+  center = (ratio + z*z/(2*n))/(1 + z*z/n)
+  half_width = z*numpy.sqrt(ratio*(1 - ratio)/n + z*z/(4*n*n))/(1 + z*z/n)
+  return (center - half_width, center + half_width)
+
+
+class MatchupResult:
+  '''
+  Merged counts for one matchup.
+  wins/losses are per seat, score_counts is the sum over games of the average
+    hand value per go around (see Tunk_Batch.BatchResult) and trajectories the merged
+    Tunk_Trajectories.TrajectoryStats of the games.
+  '''
+  def __init__(self, strategies):
+    self.strategies = list(strategies)
+    self.num_games = 0
+    self.wins = numpy.zeros(len(strategies), dtype=numpy.int64)
+    self.losses = numpy.zeros(len(strategies), dtype=numpy.int64)
+    self.score_counts = numpy.zeros(Tunk_Batch.MAX_GO_AROUNDS)
+    self.trajectories = None
+
+  def add(self, num_games, wins, losses, score_counts, trajectories=None):
+    '''
+    Adds the partial counts of one shard.
+    '''
+    self.num_games += num_games
+    self.wins += wins
+    self.losses += losses
+    self.score_counts += score_counts
+    if trajectories is not None:
+      self.trajectories = trajectories if self.trajectories is None else self.trajectories.merge(trajectories)
+
+  def as_dict(self):
+    return {'strategies': self.strategies, 'num_games': self.num_games, 'wins': self.wins.tolist(),
+            'losses': self.losses.tolist(), 'score_counts': self.score_counts.tolist()}
+
+  @staticmethod
+  def from_dict(saved):
+    result = MatchupResult(saved['strategies'])
+    result.add(saved['num_games'], numpy.array(saved['wins']), numpy.array(saved['losses']), numpy.array(saved['score_counts']))
+    return result
+
+  def win_ratios(self):
+    return self.wins*1./max(self.num_games, 1)
+
+  def confidence_intervals(self, z=Z_95):
+    return wilson_interval(self.wins, self.num_games, z)
+
+  def half_width(self, z=Z_95):
+    '''
+    Largest half width of the seats' win ratio confidence intervals.
+    '''
+    if self.num_games == 0:
+      return numpy.inf
+    (low, high) = self.confidence_intervals(z)
+    return float((high - low).max())/2
+
+  def write(self, fh):
+    '''
+    Writes the results in the same format as the Tunk_Simulator output files.
+    '''
+    for number in range(len(self.strategies)):
+      name = 'player_' + str(number+1)
+      fh.write(name + ' wins: ' + str(self.wins[number]) + '\n')
+      fh.write(name + ' losses: ' + str(self.losses[number]) + '\n')
+      fh.write(name + ' win ratio: ' + str(self.win_ratios()[number]) + '\n')
+      fh.write('\n')
+
+
+def play_shard(strategies, seeds, details=False, **kwargs):
+  '''
+  Plays the games with the given seeds in a worker and returns their partial counts.
+  With details the Tunk_Batch.BatchResult is sent back as well, with its go arounds.
+  Extra keyword arguments are passed to Tunk_Batch.BatchGame.
+  '''
+  result = Tunk_Batch.play_games(strategies, len(seeds), seeds=seeds, keep_go_arounds=details, **kwargs)
+  return (len(seeds), result.wins, result.losses, result.score_counts, result.trajectories, result if details else None)
+
+
+def trajectory_arrays(results):
+  '''
+  The trajectory statistics of every matchup as one dict of arrays, for checkpoints.
+  '''
+  arrays = {}
+  for index, result in enumerate(results):
+    if result.trajectories is not None:
+      for name, array in result.trajectories.arrays().items():
+        arrays[str(index) + '_' + name] = array
+  return arrays
+
+
+def restore_trajectories(results, arrays, rules=None):
+  '''
+  Puts the trajectory statistics saved by trajectory_arrays back on the results.
+  '''
+  for index, result in enumerate(results):
+    prefix = str(index) + '_'
+    saved = dict((name[len(prefix):], array) for name, array in arrays.items() if name.startswith(prefix))
+    if saved:
+      result.trajectories = Tunk_Trajectories.TrajectoryStats.from_arrays(result.strategies, saved, rules)
+
+
+def json_params(params):
+  '''
+  The game parameters (beta, threshhold...) as json values, the rules as a dict. Parameters
+  left at None and UNSTORED_PARAMS are left out, raises ValueError for any other parameter
+  that can't be stored.
+  '''
+  stored = {}
+  for name, value in params.items():
+    if value is None or name in UNSTORED_PARAMS:
+      continue
+    if name == 'rules':
+      value = value.as_dict()
+    elif isinstance(value, numpy.generic):
+      value = value.item()
+    if not isinstance(value, (int, float, str, dict)):
+      raise ValueError('Game parameter ' + name + ' can not be stored: ' + repr(value))
+    stored[name] = value
+  return stored
+
+
+def params_kwargs(stored):
+  '''
+  Game parameters stored by json_params as keyword arguments of a run.
+  '''
+  params = dict(stored)
+  if 'rules' in params:
+    params['rules'] = Tunk_Rules.Rules.from_dict(params['rules'])
+  return params
+
+
+def open_results(results_dir, matchups, seed, num_games, params=None):
+  '''
+  Opens a results directory for appending a run and records the run in its meta,
+  with the game parameters (beta, threshhold...) that can be stored as json, the rules as a dict.
+  Returns the writer, the id of each matchup in the directory and the id of the run's first game.
+  '''
+  writer = Tunk_Results.ResultsWriter(results_dir)
+  meta = Tunk_Results.read_meta(results_dir)
+  names = meta.get('matchups', [])
+  matchup_ids = []
+  for strategies in matchups:
+    name = ','.join(strategies)
+    if name not in names:
+      names.append(name)
+    matchup_ids.append(names.index(name))
+  runs = meta.get('runs', [])
+  first_game = sum(run['num_games'] for run in runs)
+  params = json_params(params or {})
+  runs.append({'seed': seed, 'first_game': first_game, 'num_games': sum(num_games), 'params': params})
+  writer.write_meta(matchups=names, runs=runs)
+  return (writer, matchup_ids, first_game)
+
+
+def write_shard(writer, first_game, matchup_id, shard, result, seeds):
+  '''
+  Appends the games (with their seeds) and go arounds of one shard to the results.
+  '''
+  num_games = result.num_games
+  game_ids = numpy.arange(first_game, first_game + num_games)
+  writer.append('games',
+                game=game_ids,
+                matchup=numpy.full(num_games, matchup_id, dtype=numpy.int16),
+                shard=numpy.full(num_games, shard, dtype=numpy.int32),
+                seed=numpy.asarray(seeds, dtype=numpy.uint64),
+                rounds=result.rounds.astype(numpy.int32),
+                scores=result.scores.astype(numpy.int32),
+                losers=result.losers)
+  games, rounds, go_around, average = result.go_arounds
+  writer.append('go_arounds',
+                game=game_ids[games],
+                round=rounds.astype(numpy.int32),
+                go_around=go_around.astype(numpy.int32),
+                average_hand_value=average)
+
+
+def shard_games(num_games, shard_size):
+  '''
+  Splits num_games into shard sizes.
+  '''
+  return [min(shard_size, num_games - start) for start in range(0, num_games, shard_size)]
+
+
+def run_tournament(matchups, num_games, workers=None, seed=None, shard_size=SHARD_SIZE, results_dir=None, checkpoint=None, **kwargs):
+  '''
+  Plays num_games games of every matchup (a list of strategy lists) spread over
+  workers processes (all cores by default) and returns a list of MatchupResults
+  in the same order as matchups.
+  num_games is either one count for every matchup or a list with one count per matchup.
+  seed is the root seed, a random one is drawn (and stored as .seed on the results) if not given.
+  If results_dir is given every game and go around is appended to it (see Tunk_Results).
+  If checkpoint (a directory) is given the progress of the run is saved there, and calling
+  the run again with the same checkpoint picks up where it stopped (see Tunk_Checkpoint),
+  the seed can then be left out.
+  '''
+  matchups = [list(strategies) for strategies in matchups]
+  if isinstance(num_games, int):
+    num_games = [num_games]*len(matchups)
+  if len(num_games) != len(matchups):
+    raise ValueError('Expected one game count per matchup')
+  if checkpoint is not None:
+    checkpoint = Tunk_Checkpoint.Checkpoint(checkpoint)
+    seed = seed if seed is not None else checkpoint.saved_seed()
+  if seed is None:
+    seed = numpy.random.SeedSequence().entropy
+  if workers is None:
+    workers = os.cpu_count() or 1
+
+  results = [MatchupResult(strategies) for strategies in matchups]
+  done = set()   # Shards merged into results
+  state = {}
+  if checkpoint is not None:
+    spec = dict(matchups=matchups, num_games=num_games, seed=seed, shard_size=shard_size, results_dir=results_dir,
+                params=json_params(kwargs))
+    state = checkpoint.start('tournament', spec, dict(done=[], results=None, first_game=None, matchup_ids=None, chunks={}))
+    done = set(state['done'])
+    if state['results'] is not None:
+      results = [MatchupResult.from_dict(saved) for saved in state['results']]
+      restore_trajectories(results, checkpoint.load_arrays(), kwargs.get('rules'))
+  for result in results:
+    result.seed = seed
+  writer = None
+  first_game = 0
+  if results_dir is not None:
+    if state.get('first_game') is not None:
+      # Resuming, the rows written since the checkpoint are from shards that are played again
+      for table, keep in state['chunks'].items():
+        Tunk_Results.drop_chunks(results_dir, table, keep)
+      writer = Tunk_Results.ResultsWriter(results_dir)
+      (matchup_ids, first_game) = (state['matchup_ids'], state['first_game'])
+    else:
+      (writer, matchup_ids, first_game) = open_results(results_dir, matchups, seed, num_games, kwargs)
+  details = writer is not None
+
+  def save(**progress):
+    if writer is not None:
+      writer.flush()
+      progress['chunks'] = dict((table, len(Tunk_Results.list_chunks(results_dir, table))) for table in RESULT_TABLES)
+      progress['matchup_ids'] = matchup_ids
+      progress['first_game'] = first_game
+    checkpoint.save(done=sorted(done), results=[result.as_dict() for result in results], arrays=trajectory_arrays(results), **progress)
+
+  if checkpoint is not None and writer is not None and state['first_game'] is None:
+    save()
+
+  shards = []
+  shard_id = 0
+  shard_first_game = first_game
+  for index, strategies in enumerate(matchups):
+    start = 0
+    for shard, games in enumerate(shard_games(num_games[index], shard_size)):
+      if shard_id not in done:
+        seeds = Tunk_Seeding.game_seeds(seed, numpy.arange(start, start + games), stream=(index,))
+        shards.append((shard_id, index, shard, shard_first_game, strategies, seeds))
+      shard_id += 1
+      shard_first_game += games
+      start += games
+
+  def merge(shard_info, counts):
+    (shard_id, index, shard, shard_first_game, strategies, seeds) = shard_info
+    results[index].add(*counts[:5])
+    if writer is not None:
+      write_shard(writer, shard_first_game, matchup_ids[index], shard, counts[5], seeds)
+    done.add(shard_id)
+    if checkpoint is not None and checkpoint.due():
+      save()
+
+  if workers == 1:
+    for shard_info in shards:
+      merge(shard_info, play_shard(*shard_info[4:], details=details, **kwargs))
+  else:
+    from concurrent.futures import ProcessPoolExecutor, as_completed   # Imported here, runs in one process start faster without it
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+      futures = {}
+      for shard_info in shards:
+        futures[executor.submit(play_shard, *shard_info[4:], details=details, **kwargs)] = shard_info
+      for future in as_completed(futures):
+        merge(futures[future], future.result())
+  if writer is not None:
+    writer.close()
+  if checkpoint is not None:
+    save(finished=True)
+  return results
+
+
+def run_adaptive_tournament(matchups, precision=0.01, max_games=1000000, workers=None, seed=None, shard_size=SHARD_SIZE, z=Z_95,
+                            checkpoint=None, **kwargs):
+  '''
+  Plays shards of every matchup until each seat's win ratio confidence interval is
+  at most +/- precision wide, or the matchup has played max_games games.
+  Whenever a worker frees up it gets a shard of the undecided matchup with the widest
+  interval, so lopsided matchups stop early and their workers move to close ones.
+  Returns a list of MatchupResults in the same order as matchups, with .converged set
+  on each. Game seeds are the same as in run_tournament, but how many games a matchup
+  plays can depend on the order the workers finish in.
+  With a checkpoint directory the run can be resumed like run_tournament, shards that
+  were in flight when it stopped are played first.
+  '''
+  matchups = [list(strategies) for strategies in matchups]
+  if checkpoint is not None:
+    checkpoint = Tunk_Checkpoint.Checkpoint(checkpoint)
+    seed = seed if seed is not None else checkpoint.saved_seed()
+  if seed is None:
+    seed = numpy.random.SeedSequence().entropy
+  if workers is None:
+    workers = os.cpu_count() or 1
+
+  results = [MatchupResult(strategies) for strategies in matchups]
+  next_game = [0]*len(matchups)     # Number in the matchup of the next game to submit
+  in_flight = [0]*len(matchups)    # Games submitted but not merged yet
+  flying = {}                      # (matchup, first game) -> games of every shard in flight
+  resumed = []                     # Shards in flight when the run stopped
+  if checkpoint is not None:
+    spec = dict(matchups=matchups, precision=precision, max_games=max_games, seed=seed, shard_size=shard_size, z=z,
+                params=json_params(kwargs))
+    state = checkpoint.start('adaptive', spec, dict(results=None, next_game=next_game, pending=[]))
+    if state['results'] is not None:
+      results = [MatchupResult.from_dict(saved) for saved in state['results']]
+      restore_trajectories(results, checkpoint.load_arrays(), kwargs.get('rules'))
+    next_game = state['next_game']
+    resumed = [tuple(pending) for pending in state['pending']]
+  for result in results:
+    result.seed = seed
+
+  def save(**progress):
+    checkpoint.save(results=[result.as_dict() for result in results], arrays=trajectory_arrays(results), next_game=next_game,
+                    pending=[[index, start, games] for (index, start), games in sorted(flying.items())], **progress)
+
+  def next_matchup():
+    '''
+    Picks the undecided matchup with the widest expected interval once its in flight games are in.
+    '''
+    best = None
+    best_width = 0
+    for index, result in enumerate(results):
+      played = result.num_games + in_flight[index]
+      if played >= max_games:
+        continue
+      if result.num_games > 0:
+        width = result.half_width(z)*numpy.sqrt(result.num_games*1./played)
+      elif played > 0:
+        width = z*0.5/numpy.sqrt(played)  # Widest a win ratio interval can be for this many games
+      else:
+        width = numpy.inf
+      if width <= precision:
+        continue
+      if best is None or width > best_width:
+        best = index
+        best_width = width
+    return best
+
+  def submit(index, run, start=None, games=None):
+    if start is None:
+      games = min(shard_size, max_games - results[index].num_games - in_flight[index])
+      start = next_game[index]
+      next_game[index] += games
+    seeds = Tunk_Seeding.game_seeds(seed, numpy.arange(start, start + games), stream=(index,))
+    in_flight[index] += games
+    flying[(index, start)] = games
+    return (index, start, games, run(play_shard, matchups[index], seeds, **kwargs))
+
+  def merge(index, start, games, counts):
+    in_flight[index] -= games
+    del flying[(index, start)]
+    results[index].add(*counts[:5])
+    if checkpoint is not None and checkpoint.due():
+      save()
+
+  if workers == 1:
+    for pending in resumed:
+      merge(*submit(pending[0], lambda function, *args, **kwargs: function(*args, **kwargs), *pending[1:]))
+    index = next_matchup()
+    while index is not None:
+      merge(*submit(index, lambda function, *args, **kwargs: function(*args, **kwargs)))
+      index = next_matchup()
+  else:
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+      futures = {}
+      for pending in resumed:
+        (index, start, games, future) = submit(pending[0], executor.submit, *pending[1:])
+        futures[future] = (index, start, games)
+      while True:
+        while len(futures) < 2*workers: # Keep every worker busy with one shard queued behind it
+          index = next_matchup()
+          if index is None:
+            break
+          (index, start, games, future) = submit(index, executor.submit)
+          futures[future] = (index, start, games)
+        if not futures:
+          break
+        (done, pending) = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+          merge(*futures.pop(future) + (future.result(),))
+  for result in results:
+    result.converged = result.half_width(z) <= precision
+  if checkpoint is not None:
+    save(finished=True)
+  return results
+
+
+if __name__ == '__main__':
+  # python Tunk_Tournament.py [results directory] [--checkpoint directory], run it again with the same
+  # checkpoint (or python Tunk_Checkpoint.py <directory>) to resume a run that was stopped
+  files = list(MATCHUPS)
+  args = sys.argv[1:]
+  checkpoint = None
+  if '--checkpoint' in args:
+    checkpoint = args.pop(args.index('--checkpoint') + 1)
+    args.remove('--checkpoint')
+  results_dir = args[0] if args else None
+  results = run_tournament([MATCHUPS[name] for name in files], 1000, results_dir=results_dir, checkpoint=checkpoint)
+  for name, result in zip(files, results):
+    fh = open(name, "w")
+    result.write(fh)
+    fh.close()
+    print(name + ': ' + ', '.join(str(ratio) for ratio in result.win_ratios()))
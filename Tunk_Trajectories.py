@@ -0,0 +1,160 @@
+'''
+Streaming statistics of the players' hand values over the course of a round.
+
+At the end of every go around each player's hand value is one sample, indexed both by
+the go around (0 for the first go around of a round) and by the round (0 for the first
+round of a game, rounds from MAX_ROUNDS on share the last index). For every seat and
+index TrajectoryStats keeps the count, mean and sum of squared deviations of the samples
+and a histogram of them. Hand values are small integers, so the histogram is an exact
+quantile sketch. Memory only depends on the number of seats and the rules, not on the
+number of games, and the statistics of separate runs (e.g. of parallel workers) merge
+into the statistics of the combined run. Per strategy statistics merge the seats that
+play the strategy.
+'''
+
+import numpy
+
+import Tunk_Rules
+
+
+MAX_GO_AROUNDS = 500   # Same as Tunk_Simulator.MAX_GO_AROUNDS, no round goes on longer
+MAX_ROUNDS = 50
+AXES = ('go_around', 'round')
+BUFFER_ROWS = 100000   # Samples buffered before they are added to the statistics
+
+
+def merge_moments(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+  '''
+  (count, mean, m2) of two sets of samples combined, works on numpy arrays.
+  '''
+  count = count_a + count_b
+  safe_count = numpy.maximum(count, 1)
+  delta = mean_b - mean_a
+  mean = mean_a + delta*count_b/safe_count
+  m2 = m2_a + m2_b + delta*delta*count_a*count_b/safe_count
+  return (count, mean, m2)
+
+
+class TrajectoryStats:
+  '''
+  strategies are the names of the strategies in each seat, rules the Tunk_Rules.Rules the games are played with.
+  For each axis in AXES, counts/means/m2s[axis] are (seats, indexes) arrays and
+  histograms[axis] is a (seats, indexes, hand values) array of sample counts.
+  '''
+  def __init__(self, strategies, rules=None):
+    rules = rules if rules is not None else Tunk_Rules.STANDARD_RULES
+    self.strategies = list(strategies)
+    self.max_hand_value = rules.hand_size*Tunk_Rules.MAX_CARD_VALUE
+    seats = len(self.strategies)
+    sizes = {'go_around': MAX_GO_AROUNDS, 'round': MAX_ROUNDS}
+    self.counts = dict((axis, numpy.zeros((seats, sizes[axis]), dtype=numpy.int64)) for axis in AXES)
+    self.means = dict((axis, numpy.zeros((seats, sizes[axis]))) for axis in AXES)
+    self.m2s = dict((axis, numpy.zeros((seats, sizes[axis]))) for axis in AXES)
+    self.histograms = dict((axis, numpy.zeros((seats, sizes[axis], self.max_hand_value + 1), dtype=numpy.int64)) for axis in AXES)
+    self.pending = []
+    self.pending_rows = 0
+
+  def add(self, values, rounds, go_arounds):
+    '''
+    Adds samples: values is a (samples, seats) array of hand values at the end of a go around,
+    rounds (1 for the first round) and go_arounds (0 for the first go around) say when.
+    Samples are buffered and added in bulk.
+    '''
+    self.pending.append((numpy.asarray(values), numpy.asarray(rounds), numpy.asarray(go_arounds)))
+    self.pending_rows += len(self.pending[-1][0])
+    if self.pending_rows >= BUFFER_ROWS:
+      self.flush()
+
+  def flush(self):
+    if not self.pending:
+      return
+    (values, rounds, go_arounds) = (numpy.concatenate(column) for column in zip(*self.pending))
+    self.pending = []
+    self.pending_rows = 0
+    seats = len(self.strategies)
+    bins = self.max_hand_value + 1
+    hand_values = numpy.arange(bins)
+    indexes = {'go_around': numpy.minimum(go_arounds, MAX_GO_AROUNDS - 1), 'round': numpy.minimum(rounds - 1, MAX_ROUNDS - 1)}
+    for axis in AXES:
+      size = self.counts[axis].shape[1]
+      # The histogram of the new samples gives their moments too
+      cell = ((numpy.arange(seats)[None, :]*size + indexes[axis][:, None])*bins + values).ravel()
+      histogram = numpy.bincount(cell, minlength=seats*size*bins).reshape(seats, size, bins)
+      count = histogram.sum(2)
+      total = histogram.dot(hand_values)
+      mean = total/numpy.maximum(count, 1)
+      m2 = histogram.dot(hand_values*hand_values) - total*mean
+      (self.counts[axis], self.means[axis], self.m2s[axis]) = merge_moments(
+        self.counts[axis], self.means[axis], self.m2s[axis], count, mean, m2)
+      self.histograms[axis] += histogram
+
+  def merge(self, other):
+    '''
+    Adds the samples of another TrajectoryStats of the same seats.
+    '''
+    self.flush()
+    other.flush()
+    for axis in AXES:
+      (self.counts[axis], self.means[axis], self.m2s[axis]) = merge_moments(
+        self.counts[axis], self.means[axis], self.m2s[axis], other.counts[axis], other.means[axis], other.m2s[axis])
+      self.histograms[axis] += other.histograms[axis]
+    return self
+
+  def seat_stats(self, axis, seats):
+    '''
+    (count, mean, m2, histogram) of the given seats combined, one entry per index of the axis.
+    '''
+    self.flush()
+    (count, mean, m2) = (self.counts[axis][seats[0]], self.means[axis][seats[0]], self.m2s[axis][seats[0]])
+    for seat in seats[1:]:
+      (count, mean, m2) = merge_moments(count, mean, m2, self.counts[axis][seat], self.means[axis][seat], self.m2s[axis][seat])
+    return (count, mean, m2, self.histograms[axis][list(seats)].sum(0))
+
+  def summary(self, axis='go_around', seat=None, strategy=None, quantiles=(0.1, 0.5, 0.9)):
+    '''
+    Statistics of one seat, of every seat playing a strategy, or of the whole table, by index of the axis.
+    Returns (count, mean, variance, {quantile: values}), indexes without samples have a nan mean.
+    '''
+    if seat is not None:
+      seats = [seat]
+    elif strategy is not None:
+      seats = [number for number, name in enumerate(self.strategies) if name == strategy]
+      if not seats:
+        raise ValueError('No seat plays ' + str(strategy))
+    else:
+      seats = list(range(len(self.strategies)))
+    (count, mean, m2, histogram) = self.seat_stats(axis, seats)
+    empty = count == 0
+    mean = numpy.where(empty, numpy.nan, mean)
+    variance = numpy.where(count > 1, m2/numpy.maximum(count - 1, 1), numpy.nan)
+    cumulative = histogram.cumsum(1)
+    found = {}
+    for quantile in quantiles:
+      # Lowest hand value with at least the quantile of the samples at or below it
+      found[quantile] = numpy.where(empty, numpy.nan, (cumulative < quantile*count[:, None]).sum(1))
+    return (count, mean, variance, found)
+
+  def by_strategy(self, axis='go_around', quantiles=(0.1, 0.5, 0.9)):
+    '''
+    summary() of every strategy at the table, by name.
+    '''
+    return dict((name, self.summary(axis, strategy=name, quantiles=quantiles)) for name in sorted(set(self.strategies)))
+
+  def arrays(self):
+    '''
+    The statistics as a dict of named arrays, e.g. for numpy.savez.
+    '''
+    self.flush()
+    found = {}
+    for axis in AXES:
+      for name in ('counts', 'means', 'm2s', 'histograms'):
+        found[name + '_' + axis] = getattr(self, name)[axis]
+    return found
+
+  @staticmethod
+  def from_arrays(strategies, arrays, rules=None):
+    stats = TrajectoryStats(strategies, rules)
+    for axis in AXES:
+      for name in ('counts', 'means', 'm2s', 'histograms'):
+        getattr(stats, name)[axis] = numpy.array(arrays[name + '_' + axis])
+    return stats
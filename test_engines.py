@@ -0,0 +1,120 @@
+'''
+Checks that guard the promises the engines make to each other.
+
+The scalar engine (Tunk_Simulator) and the batch engine (Tunk_Batch) play the same game for
+the same seed, for every strategy and every table rules, and a checkpointed tournament that
+is killed and resumed ends with the same results and game rows as one that never stopped.
+
+  python -m pytest -q test_engines.py
+'''
+
+import numpy
+import pytest
+
+import Tunk_Batch
+import Tunk_Checkpoint
+import Tunk_Oracle
+import Tunk_Results
+import Tunk_Rules
+import Tunk_Seeding
+import Tunk_Simulator
+import Tunk_Tournament
+
+
+NUM_GAMES = 40
+
+MATCHUPS = [
+  ['basic','basic','basic','basic'],
+  ['intermediate','intermediate','intermediate','intermediate'],
+  ['expert','expert','expert','expert'],
+  ['tuned','tuned','tuned','tuned'],
+  ['counting','counting','counting','counting'],
+  ['optimal','optimal','optimal','optimal'],
+  ['counting','expert','basic','intermediate'],
+]
+
+RULES = [
+  Tunk_Rules.Rules(num_players=2, hand_size=3),
+  Tunk_Rules.Rules(num_players=3, reshuffles=2),
+  Tunk_Rules.Rules(num_players=6, num_decks=2, hand_size=7, threshhold=100),
+  Tunk_Rules.Rules(num_players=8, num_decks=3, hand_size=15, reshuffles=1),
+]
+
+
+def oracle():
+  '''
+  An oracle table with made up call decisions, so 'optimal' seats call tunk in many states.
+  '''
+  table = Tunk_Oracle.OracleTable(seed=0)
+  table.calls = numpy.random.default_rng(0).random(table.calls.shape) < 0.5
+  return table
+
+
+def assert_same_games(strategies, rules=None, **kwargs):
+  seeds = Tunk_Seeding.game_seeds(1, numpy.arange(NUM_GAMES))
+  result = Tunk_Batch.BatchGame(strategies, NUM_GAMES, seeds=seeds, rules=rules, **kwargs).play()
+  for index, seed in enumerate(seeds):
+    game = Tunk_Simulator.Game(strategies, seed=int(seed), rules=rules, **kwargs)
+    game.play_game()
+    assert [player.score for player in game.players] == result.scores[index].tolist(), 'seed ' + str(seed)
+    assert game.round_count == result.rounds[index], 'seed ' + str(seed)
+
+
+@pytest.mark.parametrize('strategies', MATCHUPS, ids=','.join)
+def test_scalar_and_batch_games_match(strategies):
+  assert_same_games(strategies, oracle=oracle())
+
+
+@pytest.mark.parametrize('rules', RULES, ids=str)
+def test_scalar_and_batch_games_match_with_rules(rules):
+  strategies = (['counting','expert','basic','intermediate']*2)[:rules.num_players]
+  assert_same_games(strategies, rules)
+
+
+class Killed(Exception):
+  pass
+
+
+def run(tmp_path, name, kill_after=None, monkeypatch=None):
+  '''
+  Runs a small checkpointed tournament, killed when kill_after shards have been played.
+  The checkpoint is saved after every other shard, so a killed run loses some played shards.
+  '''
+  if kill_after is not None:
+    played = []
+    play_shard = Tunk_Tournament.play_shard
+    def dying_play_shard(*args, **kwargs):
+      if len(played) == kill_after:
+        raise Killed()
+      played.append(True)
+      return play_shard(*args, **kwargs)
+    monkeypatch.setattr(Tunk_Tournament, 'play_shard', dying_play_shard)
+    saves = []
+    def due(checkpoint):
+      saves.append(True)
+      return len(saves) % 2 == 0
+    monkeypatch.setattr(Tunk_Checkpoint.Checkpoint, 'due', due)
+  return Tunk_Tournament.run_tournament([['counting','expert','intermediate','expert'], ['basic','expert','expert','basic']], 150, workers=1,
+                                        seed=5, shard_size=40, results_dir=str(tmp_path / name / 'results'),
+                                        checkpoint=str(tmp_path / name / 'checkpoint'), beta=numpy.int64(3))
+
+
+def game_rows(results_dir):
+  reader = Tunk_Results.ResultsReader(results_dir)
+  rows = dict((column, reader.column('games', column)) for column in reader.columns('games'))
+  order = numpy.argsort(rows['game'], kind='stable')
+  return dict((column, values[order]) for column, values in rows.items())
+
+
+def test_killed_and_resumed_tournament_matches(tmp_path, monkeypatch):
+  expected = run(tmp_path, 'whole')
+  with pytest.raises(Killed):
+    run(tmp_path, 'killed', kill_after=5, monkeypatch=monkeypatch)
+  monkeypatch.undo()
+  resumed = Tunk_Checkpoint.resume(str(tmp_path / 'killed' / 'checkpoint'), workers=1)
+  assert [result.as_dict() for result in resumed] == [result.as_dict() for result in expected]
+  whole_rows = game_rows(str(tmp_path / 'whole' / 'results'))
+  resumed_rows = game_rows(str(tmp_path / 'killed' / 'results'))
+  assert sorted(resumed_rows) == sorted(whole_rows)
+  for column in whole_rows:
+    assert numpy.array_equal(resumed_rows[column], whole_rows[column]), column